@@ -3,12 +3,38 @@
 
 import json
 import logging
+import random
 import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Callable, Tuple
 
 import httpx
-from openai import OpenAI, Stream
+from openai import (
+    APIConnectionError,
+    AuthenticationError,
+    BadRequestError,
+    InternalServerError,
+    NotFoundError,
+    OpenAI,
+    PermissionDeniedError,
+    RateLimitError,
+    Stream,
+)
 from openai.types.chat import ChatCompletionChunk
+from openai.types.chat.chat_completion_chunk import ChoiceDelta
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时回退到标准库 json
+    orjson = None
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 为可选依赖，未安装时按字符数估算 token
+    tiktoken = None
 
 from config import config
 from prompts import get_system_prompt_by_cn
@@ -51,6 +77,320 @@ from tool_executor import create_tool_executor
 
 logger = logging.getLogger(__name__)
 
+# 可重试的 API 异常（网络错误、超时、限流、服务端 5xx）
+_RETRYABLE_API_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+# 不可重试的 API 异常（请求本身有问题，重试也不会成功）
+_FATAL_API_ERRORS = (
+    AuthenticationError,
+    BadRequestError,
+    NotFoundError,
+    PermissionDeniedError,
+)
+
+# 流式输出过程中刷新 UI 状态和 token 估算的最小间隔（秒），约 20 Hz
+_UI_UPDATE_INTERVAL = 0.05
+# 流式输出缓冲的最长滞留时间（秒）
+_OUTPUT_FLUSH_INTERVAL = 0.02
+# SDK 模型是否提供 model_extra（只有 pydantic v2 有；v1 下额外字段直接是属性）
+_DELTA_HAS_MODEL_EXTRA = hasattr(ChoiceDelta, "model_extra")
+
+# gpt-oss 模型在回复中可能残留的 "assistantfinal" 标记
+_ASSISTANT_FINAL_PATTERN = re.compile(r"assistantfinal", re.IGNORECASE)
+
+# 复用的 JSON 解码器（raw_decode 可从任意位置开始解析，并自动处理字符串和转义）
+_JSON_DECODER = json.JSONDecoder()
+# JSON 对象起点：'{' 后（跳过空白）只能是键的引号或 '}'。代码中的 '{' 先用它排除，
+# 不必调用解码器（解析失败时构造异常要统计行列号，起点很多时开销明显）
+_JSON_OBJECT_START_PATTERN = re.compile(r'\{\s*["}]')
+
+# 不完整 JSON 的键值对特征：引号包围的键，后跟冒号（如 "key": 或 'key':）
+_JSON_KEY_PATTERN = re.compile(r'["\']\s*[^"\']+\s*["\']\s*:')
+
+
+def _dumps(obj: Any) -> str:
+    """
+    紧凑序列化为 JSON 字符串（非 ASCII 字符原样输出），优先使用 orjson
+
+    Args:
+        obj: 要序列化的对象
+
+    Returns:
+        JSON 字符串
+
+    Note:
+        无法直接序列化的值（如工具返回的 Path、set）按 str() 输出，非字符串键与标准库一样转为字符串，
+        避免工具本已成功执行的结果因序列化失败被当作异常
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _parse_tool_args(tool_args: str) -> Any:
+    """
+    解析工具调用参数（只解析一次，结果直接交给工具执行器），优先使用 orjson
+
+    Args:
+        tool_args: 模型输出的参数 JSON 字符串
+
+    Returns:
+        解析后的参数；为空或不是合法 JSON 时返回空字典
+    """
+    if not tool_args:
+        return {}
+    try:
+        if orjson is not None:
+            return orjson.loads(tool_args)
+        return json.loads(tool_args)
+    except ValueError:
+        logger.warning("工具调用参数不是合法的 JSON，按空参数处理: %s", tool_args[:200])
+        return {}
+
+
+def _find_trailing_json_object(content: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    查找恰好位于文本末尾的 JSON 对象
+
+    从最后一个 '{' 开始由内向外尝试，用 C 实现的 raw_decode 解析，直到某个起点解析出的对象
+    恰好延伸到末尾（字符串中的括号由解码器正确处理）。不限制尝试次数：参数中含代码时
+    '{' 可能很多，不可能是对象起点的 '{' 由 _JSON_OBJECT_START_PATTERN 直接跳过
+
+    Args:
+        content: 已去除末尾空白的文本
+
+    Returns:
+        (JSON 起始位置, 解析出的对象)；未找到时返回 (-1, None)
+    """
+    content_len = len(content)
+    json_start = content.rfind("{")
+    while json_start != -1:
+        if not _JSON_OBJECT_START_PATTERN.match(content, json_start):
+            json_start = content.rfind("{", 0, json_start)
+            continue
+        try:
+            parsed_json, json_end = _JSON_DECODER.raw_decode(content, json_start)
+        except (ValueError, RecursionError):
+            # 从这里开始不是有效的 JSON，继续尝试更外层的 '{'
+            pass
+        else:
+            if json_end == content_len:
+                return json_start, parsed_json
+            # 解析出的是内层对象，继续向外查找
+        json_start = content.rfind("{", 0, json_start)
+    return -1, None
+
+
+class _LazyJson:
+    """延迟序列化的 JSON 日志参数：只有日志真正被输出时才序列化（优先使用 orjson）"""
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj: Any):
+        self.obj = obj
+
+    def __str__(self) -> str:
+        if orjson is not None:
+            return orjson.dumps(self.obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+        return json.dumps(self.obj, indent=2, ensure_ascii=False)
+
+
+class _OutputBuffer:
+    """
+    流式输出缓冲：合并逐 token 的小片段输出，减少 print 刷新/跨线程 UI 回调次数
+
+    不换行的片段先缓存，超过 _OUTPUT_FLUSH_INTERVAL 或遇到换行输出、显式 flush 时一次性写出。
+    流暂停时读取线程阻塞在网络上，由后台线程在 _OUTPUT_FLUSH_INTERVAL 到期后写出剩余片段，避免最后的内容一直停在缓冲中
+    """
+
+    def __init__(self, output: Callable[[str, bool], None]):
+        self._output = output
+        self._parts: List[str] = []
+        self._last_flush = time.monotonic()
+        # 保护缓冲区，并保证读取线程与后台线程的写出顺序
+        self._cond = threading.Condition()
+        self._closed = False
+        # 后台写出线程（第一次有片段留在缓冲中时创建）
+        self._flusher: Optional[threading.Thread] = None
+
+    def __call__(self, text: str, end_newline: bool = True) -> None:
+        with self._cond:
+            if end_newline:
+                self._flush_locked()
+                self._output(text, True)
+                return
+
+            was_empty = not self._parts
+            self._parts.append(text)
+            if time.monotonic() - self._last_flush >= _OUTPUT_FLUSH_INTERVAL:
+                self._flush_locked()
+                return
+
+            # 片段留在了缓冲中：确保后台线程会在到期时写出
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run_flusher, name="output-flusher", daemon=True
+                )
+                self._flusher.start()
+            elif was_empty:
+                # 后台线程只在缓冲为空时无限期等待，此时才需要唤醒
+                self._cond.notify()
+
+    def _run_flusher(self) -> None:
+        """后台线程：缓冲中有片段时等到写出期限，到期仍未写出则代为写出"""
+        with self._cond:
+            while not self._closed:
+                if not self._parts:
+                    self._cond.wait()
+                    continue
+                remaining = self._last_flush + _OUTPUT_FLUSH_INTERVAL - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        """写出缓存的片段（调用方需持有 self._cond）"""
+        if self._parts:
+            self._output("".join(self._parts), False)
+            self._parts.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        """写出缓存的片段"""
+        with self._cond:
+            self._flush_locked()
+
+    def close(self) -> None:
+        """写出剩余片段并结束后台线程"""
+        with self._cond:
+            self._flush_locked()
+            self._closed = True
+            self._cond.notify()
+
+
+@lru_cache(maxsize=None)
+def _section_banner(label: str, separator_length: int) -> str:
+    """
+    生成流式输出中各部分的标题横幅（按标题和分隔符长度缓存，分隔符长度可在配置中修改）
+
+    Args:
+        label: 标题文字
+        separator_length: 两侧分隔符 '=' 的数量
+
+    Returns:
+        横幅字符串
+    """
+    separator = "=" * separator_length
+    return f"\n{separator} {label} {separator}\n"
+
+
+# token 估算系数：中文约 1.5 字符/token，其他字符（英文、数字、标点等）约 4 字符/token
+_CHINESE_CHARS_PER_TOKEN = 1.5
+_OTHER_CHARS_PER_TOKEN = 4
+
+
+def _estimate_text_tokens(text: str) -> float:
+    """
+    估算文本的 token 数（消息和流式增量共用同一口径）
+
+    有 tiktoken 编码器时使用实际分词数，否则按字符数线性估算；两种方式都可以对流式增量逐段累加
+
+    Args:
+        text: 要估算的文本
+
+    Returns:
+        估算的 token 数（字符估算时为小数，由调用方取整）
+    """
+    encoding = _get_token_encoding()
+    if encoding is not None:
+        # 文本中的特殊 token（如 <|endoftext|>）按普通文本计数，不抛异常
+        return len(encoding.encode(text, disallowed_special=()))
+    # 中文字符数由 bytes.count 在 C 层统计
+    chinese_chars = _count_chinese_chars(text)
+    return (
+        chinese_chars / _CHINESE_CHARS_PER_TOKEN
+        + (len(text) - chinese_chars) / _OTHER_CHARS_PER_TOKEN
+    )
+
+
+# 安装 tiktoken 时用于估算消息 token 数的编码
+_TIKTOKEN_ENCODING = "o200k_base"
+# 后台加载完成的 tiktoken 编码器（加载完成前、未安装或加载失败时为 None）
+_token_encoding: Optional[Any] = None
+# 后台加载线程（只启动一次）
+_token_encoding_loader: Optional[threading.Thread] = None
+_token_encoding_lock = threading.Lock()
+
+
+def _start_token_encoding_load() -> None:
+    """
+    在后台线程中加载 tiktoken 编码器（只启动一次，不等待结果）
+
+    本地没有缓存时 tiktoken 会联网下载词表且没有超时，不能阻塞启动；
+    加载完成前 _get_token_encoding 返回 None，按字符数估算
+    """
+    global _token_encoding_loader
+    if tiktoken is None:
+        return
+    with _token_encoding_lock:
+        if _token_encoding_loader is not None:
+            return
+        _token_encoding_loader = threading.Thread(
+            target=_load_token_encoding, name="tiktoken-loader", daemon=True
+        )
+        _token_encoding_loader.start()
+
+
+def _load_token_encoding() -> None:
+    """后台线程：加载 tiktoken 编码器，失败时保持字符数估算"""
+    global _token_encoding
+    try:
+        _token_encoding = tiktoken.get_encoding(_TIKTOKEN_ENCODING)
+    except Exception as e:
+        logger.warning("加载 tiktoken 编码失败，改用字符数估算 token: %s", e)
+        return
+    logger.debug("tiktoken 编码已加载: %s", _TIKTOKEN_ENCODING)
+
+
+def _get_token_encoding() -> Optional[Any]:
+    """
+    获取已加载的 tiktoken 编码器（不等待后台加载）
+
+    Returns:
+        编码器；未安装 tiktoken、尚未加载完成或加载失败时返回 None（改用字符数估算）
+    """
+    return _token_encoding
+
+
+def _count_chinese_chars(text: str) -> int:
+    """
+    统计文本中的中文字符数
+
+    CJK 统一汉字（U+4E00-U+9FFF）的 UTF-8 编码首字节都落在 0xE4-0xE9 之间，
+    且这些字节值不会作为续字节出现，用 bytes.count（C 实现）统计即可，无需逐字符比较。
+    会把少量相邻区块（如 U+4000-U+4DFF）也算进来，但 token 估算本身就是粗略的
+
+    Args:
+        text: 要统计的文本
+
+    Returns:
+        中文字符数
+    """
+    # 纯 ASCII 字符串（英文回复、代码、JSON 参数等）在 CPython 中带有标记，判断是 O(1) 的，
+    # 可以直接跳过编码和扫描
+    if text.isascii():
+        return 0
+    encoded = text.encode("utf-8")
+    # 六个首字节逐个 count 展开写，省去生成器的开销（流式增量通常只有几个字符，开销占比明显）
+    return (
+        encoded.count(b"\xe4")
+        + encoded.count(b"\xe5")
+        + encoded.count(b"\xe6")
+        + encoded.count(b"\xe7")
+        + encoded.count(b"\xe8")
+        + encoded.count(b"\xe9")
+    )
+
 
 class MessageManager:
     """消息管理器（支持多段上下文）"""
@@ -82,18 +422,33 @@ class MessageManager:
         self.estimated_tokens: int = 0
         # 上下文总结（用于新段）
         self.context_summaries: List[str] = []
+        # 当前段的系统提示词及其估算 token 数（段内不变，只在创建/加载段时计算一次）
+        self._system_prompt: str = system_prompt
+        self._system_tokens: int = 0
+        # 当前段除系统提示词外每条消息的 JSON 序列化结果（与 messages[1:] 一一对应），
+        # 消息追加时增量序列化，调试日志直接拼接，不必每轮重新 dumps 整个历史
+        self._serialized_log: List[str] = []
+        # 当前段除系统提示词外每条消息计入 prompt 的估算 token 数（同样与 messages[1:] 对应）及其总和，
+        # 流式估算时直接使用总和，不必每次重新扫描整个历史
+        self._message_tokens: List[int] = []
+        self._prompt_tokens_estimate: int = 0
+        # tiktoken 编码器在后台加载；上面的缓存是否已按它计算（加载完成后换算一次，保持同一口径）
+        _start_token_encoding_load()
+        self._counted_with_encoding: bool = _get_token_encoding() is not None
         # 初始化第一个段
         self._create_new_segment()
 
     def _create_new_segment(self) -> None:
         """创建新的消息段"""
         # 创建新段，包含系统提示词（此时 current_tokens 为 0，所以使用率会是 0%）
-        new_segment = [
-            {"role": "system", "content": self._get_system_prompt_with_context()}
-        ]
+        self._refresh_system_prompt()
+        new_segment = [{"role": "system", "content": self._system_prompt}]
         self.segments.append(new_segment)
         self.current_segment_index = len(self.segments) - 1
         self.messages = self.segments[self.current_segment_index]
+        self._serialized_log = []
+        self._message_tokens = []
+        self._prompt_tokens_estimate = 0
         # 重置 token 计数（新段开始时为 0）
         self.current_tokens = 0
         self.estimated_tokens = 0
@@ -102,9 +457,10 @@ class MessageManager:
         self._update_context_usage_message()
         
         logger.info(
-            f"创建新消息段 - 段索引: {self.current_segment_index}, "
-            f"总段数: {len(self.segments)}, "
-            f"历史总结数: {len(self.context_summaries)}"
+            "创建新消息段 - 段索引: %s, "
+            "总段数: %s, "
+            "历史总结数: %s",
+            self.current_segment_index, len(self.segments), len(self.context_summaries)
         )
 
     def _get_system_prompt_with_context(self) -> str:
@@ -116,18 +472,30 @@ class MessageManager:
         """
         # 如果有历史总结，添加到系统提示词中
         if self.context_summaries:
-            context_info = "\n━━━━━━━━━━━━━━\n【历史上下文总结】\n━━━━━━━━━━━━━━\n"
-            for i, summary in enumerate(self.context_summaries, 1):
-                context_info += f"\n段 {i} 总结：\n{summary}\n"
+            parts = [
+                self.base_system_prompt,
+                "\n━━━━━━━━━━━━━━\n【历史上下文总结】\n━━━━━━━━━━━━━━\n",
+            ]
+            parts.extend(
+                f"\n段 {i} 总结：\n{summary}\n"
+                for i, summary in enumerate(self.context_summaries, 1)
+            )
             # 重要：如果有历史总结，说明有未完成的任务，应该自动继续执行
-            context_info += "\n重要提示：\n"
-            context_info += "- 如果历史总结中包含未完成的任务或下一步计划，你必须自动继续执行，不要等待用户输入\n"
-            context_info += "- 新段创建后，你应该立即根据历史总结中的\"下一步计划\"继续执行任务\n"
-            context_info += "- 只有在所有任务都完成后，或者遇到需要用户决策的问题时，才应该询问用户\n"
-            return self.base_system_prompt + context_info
+            parts.append(
+                "\n重要提示：\n"
+                "- 如果历史总结中包含未完成的任务或下一步计划，你必须自动继续执行，不要等待用户输入\n"
+                "- 新段创建后，你应该立即根据历史总结中的\"下一步计划\"继续执行任务\n"
+                "- 只有在所有任务都完成后，或者遇到需要用户决策的问题时，才应该询问用户\n"
+            )
+            return "".join(parts)
         
         return self.base_system_prompt
     
+    def _refresh_system_prompt(self) -> None:
+        """重新生成当前段的系统提示词，并缓存其估算 token 数"""
+        self._system_prompt = self._get_system_prompt_with_context()
+        self._system_tokens = self.estimate_tokens(self._system_prompt)
+
     def _get_context_usage_message(self) -> str:
         """
         生成极简化的上下文使用情况系统消息（极限压缩 token）
@@ -159,6 +527,12 @@ class MessageManager:
             if last_content.startswith("上下文:") or last_content.startswith("Context:"):
                 # 更新最后一条消息
                 self.messages[-1]["content"] = context_message
+                if self._serialized_log:
+                    self._serialized_log[-1] = _dumps(self.messages[-1])
+                if self._message_tokens:
+                    new_tokens = self._estimate_message_prompt_tokens(self.messages[-1])
+                    self._prompt_tokens_estimate += new_tokens - self._message_tokens[-1]
+                    self._message_tokens[-1] = new_tokens
                 logger.debug("已更新上下文使用情况系统消息")
                 return
         
@@ -178,9 +552,10 @@ class MessageManager:
         self.estimated_tokens = prompt_tokens  # 同步更新估算值
 
         logger.debug(
-            f"更新 token 使用量 - "
-            f"旧值: {old_tokens}, 新值: {prompt_tokens}, "
-            f"使用率: {self.get_token_usage_percent():.2f}%"
+            "更新 token 使用量 - "
+            "旧值: %s, 新值: %s, "
+            "使用率: %.2f%%",
+            old_tokens, prompt_tokens, self.get_token_usage_percent()
         )
 
         # 在每轮对话后更新或添加上下文使用情况的系统消息
@@ -190,15 +565,19 @@ class MessageManager:
         # 检查是否需要创建新段（使用率达到 80%）
         if self.get_token_usage_percent() >= 80.0:
             logger.warning(
-                f"当前段使用率已达到 {self.get_token_usage_percent():.2f}%，"
-                f"需要总结并创建新段"
+                "当前段使用率已达到 %.2f%%，"
+                "需要总结并创建新段",
+                self.get_token_usage_percent()
             )
             # 注意：这里不立即创建新段，而是让模型主动总结
             # 模型会在回复中总结，然后我们检测到总结后创建新段
 
     def estimate_tokens(self, text: str) -> int:
         """
-        估算文本的 token 数量（简单估算：中文约 1.5 字符/token，英文约 4 字符/token）
+        估算文本的 token 数量
+
+        tiktoken 编码器加载完成后使用实际分词结果，否则简单估算：中文约 1.5 字符/token，英文约 4 字符/token。
+        每条消息只在加入时估算一次；流式增量按同一口径逐段累加（见 update_estimated_completion_tokens）
 
         Args:
             text: 要估算的文本
@@ -209,57 +588,71 @@ class MessageManager:
         if not text:
             return 0
 
-        # 简单估算：统计中文字符和英文字符
-        chinese_chars = sum(1 for c in text if "\u4e00" <= c <= "\u9fff")
-        other_chars = len(text) - chinese_chars
+        return max(1, int(_estimate_text_tokens(text)))  # 至少返回 1
 
-        # 中文字符：约 1.5 字符/token
-        # 其他字符（英文、数字、标点等）：约 4 字符/token
-        estimated = int(chinese_chars / 1.5 + other_chars / 4)
-        return max(1, estimated)  # 至少返回 1
-
-    def update_estimated_tokens(self, completion_content: str = "") -> None:
+    def update_estimated_completion_tokens(self, completion_tokens: float) -> None:
         """
-        更新估算的 token 使用量（用于实时显示）
+        根据流式累加的 completion token 估算值更新估算的 token 使用量（无需拼接字符串）
 
         Args:
-            completion_content: 当前已生成的 completion 内容
+            completion_tokens: 当前已生成内容按增量累加的 token 估算值
         """
-        # 估算 prompt tokens（基于消息历史）
-        prompt_text = ""
-        for msg in self.messages:
-            if msg.get("role") == "system":
-                prompt_text += msg.get("content", "")
-            elif msg.get("role") == "user":
-                prompt_text += msg.get("content", "")
-            elif msg.get("role") == "assistant":
-                # 如果是工具调用，估算工具调用的 token
-                if "tool_calls" in msg:
-                    for tc in msg.get("tool_calls", []):
-                        if "function" in tc:
-                            func = tc["function"]
-                            prompt_text += func.get("name", "") + func.get(
-                                "arguments", ""
-                            )
-                else:
-                    # 如果是普通回复，不计算到 prompt 中（因为这是 completion）
-                    pass
-            elif msg.get("role") == "tool":
-                prompt_text += msg.get("content", "")
+        self._set_estimated_tokens(int(completion_tokens))
+
+    def _sync_token_scale(self) -> None:
+        """tiktoken 编码器加载完成后，把此前按字符数估算的缓存重新计算一次，与之后的估算保持同一口径"""
+        if self._counted_with_encoding or _get_token_encoding() is None:
+            return
+        self._counted_with_encoding = True
+        self._system_tokens = self.estimate_tokens(self._system_prompt)
+        self._message_tokens = [
+            self._estimate_message_prompt_tokens(msg) for msg in self.messages[1:]
+        ]
+        self._prompt_tokens_estimate = sum(self._message_tokens)
 
-        # 估算 completion tokens（基于已生成的内容）
-        completion_tokens = self.estimate_tokens(completion_content)
+    def _set_estimated_tokens(self, completion_tokens: int) -> None:
+        """
+        根据 completion token 数更新估算的总 token 使用量
 
+        Args:
+            completion_tokens: 估算的 completion token 数
+        """
         # 总估算 = prompt tokens + completion tokens
         # 如果已经有实际的 current_tokens（来自上次 API 响应），使用它作为基础
         if self.current_tokens > 0:
             # 基于上次的实际值，加上新增的 completion tokens
             # 减去上次的 completion tokens（如果有的话）
             self.estimated_tokens = self.current_tokens + completion_tokens
-        else:
-            # 如果还没有实际值，完全基于估算
-            prompt_tokens = self.estimate_tokens(prompt_text)
-            self.estimated_tokens = prompt_tokens + completion_tokens
+            return
+
+        # 如果还没有实际值，完全基于估算（基于消息历史）
+        # 系统提示词和各条消息的估算值都在消息加入时算好，这里只做加法
+        self._sync_token_scale()
+        prompt_tokens = self._system_tokens + self._prompt_tokens_estimate
+        self.estimated_tokens = prompt_tokens + completion_tokens
+
+    def _estimate_message_prompt_tokens(self, message: Dict[str, Any]) -> int:
+        """
+        估算单条消息计入 prompt 的 token 数
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            估算的 token 数（普通助手回复属于 completion，不计入）
+        """
+        role = message.get("role")
+        if role in ("system", "user", "tool"):
+            return self.estimate_tokens(message.get("content", ""))
+        if role == "assistant" and "tool_calls" in message:
+            # 如果是工具调用，估算工具调用的 token（名称 + 参数）
+            text = "".join(
+                tc["function"].get("name", "") + tc["function"].get("arguments", "")
+                for tc in message.get("tool_calls", [])
+                if "function" in tc
+            )
+            return self.estimate_tokens(text)
+        return 0
 
     def get_estimated_token_usage_percent(self) -> float:
         """
@@ -282,7 +675,7 @@ class MessageManager:
     def _manage_context(self) -> None:
         """
         管理上下文，当超过段限制时删除旧消息（保留系统消息）
-        注意：现在使用分段管理，不再需要删除旧消息
+        注意：现在使用分段管理，不再需要删除旧消息；该方法目前没有调用方
         """
         # 如果当前段超过限制，删除旧消息（保留系统消息）
         removed_count = 0
@@ -292,141 +685,226 @@ class MessageManager:
         ):
             # 保留系统消息，删除第一个非系统消息
             removed_message = self.messages.pop(1)
+            if self._serialized_log:
+                self._serialized_log.pop(0)
+            if self._message_tokens:
+                self._prompt_tokens_estimate -= self._message_tokens.pop(0)
             removed_count += 1
             logger.debug(
-                f"当前段已满，删除旧消息 - "
-                f"当前使用: {self.current_tokens}/{self.segment_max_tokens}, "
-                f"消息角色: {removed_message.get('role', 'unknown')}"
+                "当前段已满，删除旧消息 - "
+                "当前使用: %s/%s, "
+                "消息角色: %s",
+                self.current_tokens,
+                self.segment_max_tokens,
+                removed_message.get('role', 'unknown')
             )
 
         if removed_count > 0:
             logger.info(
-                f"上下文管理完成 - 删除了 {removed_count} 条旧消息, "
-                f"剩余消息数: {len(self.messages)}"
+                "上下文管理完成 - 删除了 %s 条旧消息, "
+                "剩余消息数: %s",
+                removed_count, len(self.messages)
             )
 
+    def _append_message(self, message: Dict[str, Any]) -> None:
+        """
+        追加消息到当前段，并增量记录其序列化结果
+
+        Args:
+            message: 消息字典
+        """
+        self.messages.append(message)
+        self._serialized_log.append(_dumps(message))
+        message_tokens = self._estimate_message_prompt_tokens(message)
+        self._message_tokens.append(message_tokens)
+        self._prompt_tokens_estimate += message_tokens
+
+    def _extend_messages(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        批量追加消息到当前段（一次 extend，并同步更新序列化记录和 token 估算缓存）
+
+        Args:
+            messages: 消息字典列表
+        """
+        self.messages.extend(messages)
+        self._serialized_log.extend(
+            _dumps(message) for message in messages
+        )
+        message_tokens = [self._estimate_message_prompt_tokens(message) for message in messages]
+        self._message_tokens.extend(message_tokens)
+        self._prompt_tokens_estimate += sum(message_tokens)
+
+    def get_serialized_log(self) -> str:
+        """
+        获取当前段消息（不含段首系统提示词）的 JSON 文本（用于调试日志）
+
+        Returns:
+            JSON 数组格式的消息记录
+        """
+        return "[\n" + ",\n".join(self._serialized_log) + "\n]"
+
+    @property
+    def message_count(self) -> int:
+        """当前段的消息数量（含段首系统提示词）"""
+        return len(self.messages)
+
+    def tail(self, n: int) -> Tuple[Dict[str, Any], ...]:
+        """
+        获取当前段最后 n 条消息的只读快照
+
+        Args:
+            n: 消息条数
+
+        Returns:
+            消息元组
+        """
+        if n <= 0:
+            return ()
+        return tuple(self.messages[-n:])
+
     def add_system_message(self, content: str) -> None:
         """添加系统消息"""
-        self.messages.append({"role": "system", "content": f"{content}"})
-        logger.debug(f"已添加系统消息 - 长度: {len(content)}")
+        self._append_message({"role": "system", "content": f"{content}"})
+        logger.debug("已添加系统消息 - 长度: %s", len(content))
 
     def add_user_message(self, content: str) -> None:
         """添加用户消息"""
-        self.messages.append({"role": "user", "content": f"{content}"})
-        logger.debug(f"已添加用户消息 - 长度: {len(content)}")
+        self._append_message({"role": "user", "content": f"{content}"})
+        logger.debug("已添加用户消息 - 长度: %s", len(content))
 
     def add_assistant_content(self, content: str) -> None:
         """添加助手内容"""
-        self.messages.append({"role": "assistant", "content": f"{content}"})
-        logger.debug(f"已添加助手回复 - 长度: {len(content)}")
+        self._append_message({"role": "assistant", "content": f"{content}"})
+        logger.debug("已添加助手回复 - 长度: %s", len(content))
     
     def add_assistant_reasoning(self, content: str) -> None:
         """添加助手思考内容（不会加载到上下文，但会保留在记录中）"""
-        self.messages.append({
+        self._append_message({
             "role": "assistant", 
             "content": f"{content}",
             "_is_reasoning": True  # 内部标记，表示这是思考内容
         })
-        logger.debug(f"已添加助手思考内容 - 长度: {len(content)}")
+        logger.debug("已添加助手思考内容 - 长度: %s", len(content))
 
     def add_assistant_tool_call_result(self, tool_call_id: str, content: str) -> None:
         """添加助手工具调用结果"""
-        self.messages.append(
-            {"role": "tool", "tool_call_id": tool_call_id, "content": f"{content}"}
-        )
+        self._append_message(self._build_tool_result_message(tool_call_id, content))
         logger.debug(
-            f"已添加工具调用结果 - ID: {tool_call_id}, 结果长度: {len(content)}"
+            "已添加工具调用结果 - ID: %s, 结果长度: %s",
+            tool_call_id, len(content)
         )
 
     def add_assistant_tool_call(
         self, tool_call_id: str, name: str, arguments: str = ""
     ) -> None:
         """添加助手工具调用"""
-        self.messages.append(
-            {
-                "role": "assistant",
-                "content": "",  # 当有 tool_calls 时，content 应为空字符串（某些 API 实现不接受 None）
-                "tool_calls": [
-                    {
-                        "id": tool_call_id,
-                        "type": "function",
-                        "function": {
-                            "name": name,
-                            "arguments": arguments,
-                        },
-                    }
-                ],
-            }
-        )
+        self._append_message(self._build_tool_call_message(tool_call_id, name, arguments))
         logger.debug(
-            f"已添加工具调用 - ID: {tool_call_id}, 工具: {name}, "
-            f"参数长度: {len(arguments)}"
+            "已添加工具调用 - ID: %s, 工具: %s, "
+            "参数长度: %s",
+            tool_call_id, name, len(arguments)
         )
 
-    def _validate_and_clean_messages(self, messages: List[Dict]) -> List[Dict]:
+    def add_tool_round(self, records: List[Tuple[str, str, str, str]]) -> None:
         """
-        验证并清理消息格式，确保符合 OpenAI API 规范
-        
+        一次性添加一轮工具调用及其结果（每个调用紧跟它的结果，保证消息历史中调用和结果成对出现）
+
         Args:
-            messages: 原始消息列表
-            
-        Returns:
-            清理后的消息列表
+            records: (工具调用 ID, 工具名称, 参数字符串, 结果内容) 列表
         """
-        cleaned_messages = []
-        for msg in messages:
-            cleaned_msg = msg.copy()
-            role = cleaned_msg.get("role")
-            
-            # 移除内部标记字段（如 _is_reasoning），这些字段不应该发送给 API
-            if "_is_reasoning" in cleaned_msg:
-                del cleaned_msg["_is_reasoning"]
-            
-            # 确保 content 字段的类型正确
-            if "content" in cleaned_msg:
-                content = cleaned_msg["content"]
-                # 如果 content 是 None，根据是否有 tool_calls 决定处理方式
-                if content is None:
-                    # 如果有 tool_calls，content 可以是 None
-                    if "tool_calls" not in cleaned_msg or not cleaned_msg["tool_calls"]:
-                        # 如果没有 tool_calls，content 不能是 None，设置为空字符串
-                        cleaned_msg["content"] = ""
-                elif not isinstance(content, (str, list)):
-                    # 如果 content 不是字符串或列表，转换为字符串
-                    cleaned_msg["content"] = str(content) if content is not None else ""
-            
-            # 确保 tool_calls 存在时，content 为空字符串
-            if "tool_calls" in cleaned_msg and cleaned_msg["tool_calls"]:
-                if "content" not in cleaned_msg or cleaned_msg["content"]:
-                    # 如果有 tool_calls，content 应该为空字符串（某些 API 实现不接受 None）
+        if not records:
+            return
+        new_messages: List[Dict[str, Any]] = []
+        for tool_call_id, name, arguments, content in records:
+            new_messages.append(self._build_tool_call_message(tool_call_id, name, arguments))
+            new_messages.append(self._build_tool_result_message(tool_call_id, content))
+        self._extend_messages(new_messages)
+        logger.debug("已添加 %s 组工具调用及结果", len(records))
+
+    @staticmethod
+    def _build_tool_call_message(
+        tool_call_id: str, name: str, arguments: str
+    ) -> Dict[str, Any]:
+        """构造助手工具调用消息"""
+        return {
+            "role": "assistant",
+            "content": "",  # 当有 tool_calls 时，content 应为空字符串（某些 API 实现不接受 None）
+            "tool_calls": [
+                {
+                    "id": tool_call_id,
+                    "type": "function",
+                    "function": {
+                        "name": name,
+                        "arguments": arguments,
+                    },
+                }
+            ],
+        }
+
+    @staticmethod
+    def _build_tool_result_message(tool_call_id: str, content: str) -> Dict[str, Any]:
+        """构造工具调用结果消息"""
+        return {"role": "tool", "tool_call_id": str(tool_call_id), "content": f"{content}"}
+
+    @staticmethod
+    def _normalize_message(message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        规范化单条消息格式，确保符合 OpenAI API 规范
+
+        add_* 方法生成的消息本身就是规范格式，只有从外部加载的历史消息需要经过这里，
+        这样 get_messages 不必在每次调用 API 时复制并校验整个历史
+
+        Args:
+            message: 原始消息
+
+        Returns:
+            规范化后的消息（新字典，内部标记字段如 _is_reasoning 原样保留）
+        """
+        cleaned_msg = message.copy()
+
+        # 确保 content 字段的类型正确
+        if "content" in cleaned_msg:
+            content = cleaned_msg["content"]
+            # 如果 content 是 None，根据是否有 tool_calls 决定处理方式
+            if content is None:
+                # 如果有 tool_calls，content 可以是 None
+                if "tool_calls" not in cleaned_msg or not cleaned_msg["tool_calls"]:
+                    # 如果没有 tool_calls，content 不能是 None，设置为空字符串
                     cleaned_msg["content"] = ""
-            
-            # 确保 tool_call_id 是字符串
-            if "tool_call_id" in cleaned_msg:
-                tool_call_id = cleaned_msg["tool_call_id"]
-                if not isinstance(tool_call_id, str):
-                    cleaned_msg["tool_call_id"] = str(tool_call_id)
-            
-            cleaned_messages.append(cleaned_msg)
-        
-        return cleaned_messages
+            elif not isinstance(content, (str, list)):
+                # 如果 content 不是字符串或列表，转换为字符串
+                cleaned_msg["content"] = str(content)
+
+        # 确保 tool_calls 存在时，content 为空字符串
+        if "tool_calls" in cleaned_msg and cleaned_msg["tool_calls"]:
+            if "content" not in cleaned_msg or cleaned_msg["content"]:
+                # 如果有 tool_calls，content 应该为空字符串（某些 API 实现不接受 None）
+                cleaned_msg["content"] = ""
+
+        # 确保 tool_call_id 是字符串
+        if "tool_call_id" in cleaned_msg:
+            tool_call_id = cleaned_msg["tool_call_id"]
+            if not isinstance(tool_call_id, str):
+                cleaned_msg["tool_call_id"] = str(tool_call_id)
+
+        return cleaned_msg
 
     def get_messages(self) -> List[Dict[str, str]]:
         """
-        获取当前段的消息（已验证和清理）
+        获取当前段的消息（消息在加入时已是规范格式）
         注意：只返回当前段的消息，不包含历史段
         思考内容会被过滤掉，不会加载到上下文
+        返回的是新列表，但其中的消息字典与内部共享，调用方不应修改
         """
         # 更新系统提示词以包含最新的上下文信息
         if self.messages and self.messages[0].get("role") == "system":
-            self.messages[0]["content"] = self._get_system_prompt_with_context()
+            self.messages[0]["content"] = self._system_prompt
         
         # 过滤掉思考内容（标记为 _is_reasoning 的消息）
-        messages = [
-            msg for msg in self.messages.copy() 
+        return [
+            msg for msg in self.messages
             if not msg.get("_is_reasoning", False)
         ]
-        return self._validate_and_clean_messages(messages)
     
     def get_all_segments(self) -> List[List[Dict[str, str]]]:
         """
@@ -544,13 +1022,28 @@ class MessageManager:
                 self.current_segment_index = len(self.segments) - 1
                 self.messages = self.segments[self.current_segment_index]
         
+        # 外部加载的消息格式不可控，在这里统一规范化一次（原地替换，保持 self.messages 引用不变）
+        for segment in self.segments:
+            segment[:] = [self._normalize_message(msg) for msg in segment]
+
+        # 加载后总结已清空，get_messages 会用基础系统提示词覆盖段首
+        self._refresh_system_prompt()
+        self._serialized_log = [
+            _dumps(msg) for msg in self.messages[1:]
+        ]
+        self._message_tokens = [
+            self._estimate_message_prompt_tokens(msg) for msg in self.messages[1:]
+        ]
+        self._prompt_tokens_estimate = sum(self._message_tokens)
+
         # 重置 token 计数（加载历史记录时无法准确知道 token 使用情况）
         self.current_tokens = 0
         self.estimated_tokens = 0
         
         logger.info(
-            f"已加载消息历史 - 总段数: {len(self.segments)}, "
-            f"当前段索引: {self.current_segment_index}"
+            "已加载消息历史 - 总段数: %s, "
+            "当前段索引: %s",
+            len(self.segments), self.current_segment_index
         )
 
     def get_token_usage_percent(self) -> float:
@@ -591,13 +1084,14 @@ class MessageManager:
         """
         if summary:
             self.context_summaries.append(summary)
-            logger.info(f"已保存段 {self.current_segment_index + 1} 的总结")
+            logger.info("已保存段 %s 的总结", self.current_segment_index + 1)
         
         # 创建新段
         self._create_new_segment()
         logger.info(
-            f"已创建新段 - 当前段索引: {self.current_segment_index}, "
-            f"历史总结数: {len(self.context_summaries)}"
+            "已创建新段 - 当前段索引: %s, "
+            "历史总结数: %s",
+            self.current_segment_index, len(self.context_summaries)
         )
 
 
@@ -608,29 +1102,54 @@ class ReActAgent:
         """初始化 Agent"""
         logger.info("初始化 ReActAgent")
         logger.debug(
-            f"配置信息 - "
-            f"工作目录: {config.work_dir}, "
-            f"最大上下文: {config.max_context_tokens}, "
-            f"模型: {config.model}"
+            "配置信息 - "
+            "工作目录: %s, "
+            "最大上下文: %s, "
+            "模型: %s",
+            config.work_dir, config.max_context_tokens, config.model
         )
 
+        # 整个 Agent 生命周期复用同一个 HTTP/2 连接池，避免每次请求/重试重新建立 TCP+TLS 连接
+        self.http_client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+            timeout=httpx.Timeout(300.0, connect=5.0),  # 设置超时时间为 300 秒（5 分钟）
+        )
         self.client = OpenAI(
             api_key=config.api_key,
             base_url=config.base_url,
-            timeout=300.0,  # 设置超时时间为 300 秒（5 分钟）
+            http_client=self.http_client,
+            # 重试统一由 _call_api_with_retry 处理（含退避和 Retry-After），
+            # 关闭 SDK 自带的重试，避免两层重试叠加放大请求次数
+            max_retries=0,
         )
         self.chat_count = 0
+        # 当前流式响应中已接收的思考、回复字符数（用于日志）
+        self._reasoning_len = 0
+        self._content_len = 0
+        # 当前流式响应已生成内容的 token 估算值（按增量累加，与消息估算同一口径）
+        self._completion_tokens = 0.0
+        # 上次刷新 UI 状态后新增、尚未计入估算的内容片段（到刷新时再一次性估算）
+        self._pending_status_parts: List[str] = []
+        # 上次刷新 UI 状态的时间（time.monotonic）
+        self._last_ui_tick = 0.0
+        # 并行执行只读工具调用的线程池（首次需要时创建）
+        self._tool_pool: Optional[ThreadPoolExecutor] = None
         self.should_stop = False  # 中断标志（需要在创建工具执行器之前初始化）
         self.tools = self._create_tools()
+        # 工具定义在运行期间不会变化，API 请求使用的 schema 列表只构建一次
+        self._tools_schema: List[Dict[str, Any]] = [
+            {"type": "function", "function": tool.to_dict()} for tool in self.tools
+        ]
         # 传递 should_stop 检查函数给工具执行器
         # 使用 lambda 确保每次调用时都获取最新的 should_stop 值
         self.tool_executor = create_tool_executor(self.tools, lambda: self.should_stop)
-        logger.debug(f"工具执行器已创建，should_stop 检查函数: {self.tool_executor.should_stop_check is not None}")
+        logger.debug("工具执行器已创建，should_stop 检查函数: %s", self.tool_executor.should_stop_check is not None)
         self.message_manager = MessageManager(
             self._get_system_prompt(), config.max_context_tokens
         )
 
-        logger.info(f"Agent 初始化完成 - 工具数量: {len(self.tools)}")
+        logger.info("Agent 初始化完成 - 工具数量: %s", len(self.tools))
 
     def _create_tools(self) -> List[Tool]:
         """创建工具列表"""
@@ -669,8 +1188,8 @@ class ReActAgent:
             # 上下文管理工具
             SummarizeContextTool(config.work_dir, self._handle_context_summary),
         ]
-        logger.debug(f"工具列表创建完成 - 工具数量: {len(tools)}")
-        logger.debug(f"工具名称: {[tool.name for tool in tools]}")
+        logger.debug("工具列表创建完成 - 工具数量: %s", len(tools))
+        logger.debug("工具名称: %s", [tool.name for tool in tools])
         return tools
     
     def _handle_context_summary(self, summary: str) -> None:
@@ -680,7 +1199,7 @@ class ReActAgent:
         Args:
             summary: 总结内容
         """
-        logger.info(f"收到上下文总结，长度: {len(summary)}")
+        logger.info("收到上下文总结，长度: %s", len(summary))
         # 创建新段
         self.message_manager.create_new_segment_with_summary(summary)
         logger.info("已创建新对话段")
@@ -691,9 +1210,7 @@ class ReActAgent:
             "上下文已总结并创建新段。请根据历史总结中的\"下一步计划\"自动继续执行任务，"
             "不要等待用户输入。只有在所有任务都完成后，或遇到需要用户决策的问题时，才应该询问用户。"
         )
-        self.message_manager.messages.append(
-            {"role": "system", "content": continue_message}
-        )
+        self.message_manager.add_system_message(continue_message)
         logger.info("已添加继续执行提示消息")
 
     def _get_system_prompt(self) -> str:
@@ -702,8 +1219,8 @@ class ReActAgent:
         return get_system_prompt_by_cn(config, tools_names)
 
     def _get_tools(self) -> List[Dict[str, Any]]:
-        """获取工具列表"""
-        return [{"type": "function", "function": tool.to_dict()} for tool in self.tools]
+        """获取工具列表（初始化时构建的 schema，调用方不应修改）"""
+        return self._tools_schema
     
     def _get_tools_names(self) -> str:
         """获取工具名称"""
@@ -737,50 +1254,24 @@ class ReActAgent:
         if not reasoning_content:
             return False
 
-        # 去除末尾空白
-        content = reasoning_content.strip()
-        if not content:
-            return False
-
-        # 查找最后一个 JSON 对象（从末尾开始）
-        # 找到最后一个 '}' 的位置
-        last_brace_pos = content.rfind("}")
-        if last_brace_pos == -1:
+        # 去除末尾空白（JSON 参数可能很长，如写入整个文件，需要在完整内容上查找）
+        content = reasoning_content.rstrip()
+        # 快速预过滤：末尾不是 '}' 的一定不是 JSON 对象，绝大多数思考内容在这里直接返回
+        if not content.endswith("}"):
             return False
 
-        # 从最后一个 '}' 向前查找匹配的 '{'
-        brace_count = 1
-        json_start = -1
-        for i in range(last_brace_pos - 1, -1, -1):
-            if content[i] == "}":
-                brace_count += 1
-            elif content[i] == "{":
-                brace_count -= 1
-                if brace_count == 0:
-                    json_start = i
-                    break
-
-        # 如果找到了匹配的 '{'，尝试解析 JSON
-        if json_start != -1:
-            json_str = content[json_start : last_brace_pos + 1]
-            # 检查 JSON 后面是否只有空白或换行
-            after_json = content[last_brace_pos + 1 :].strip()
-            if not after_json or after_json in ["\n", "\r\n"]:
-                try:
-                    parsed_json = json.loads(json_str)
-                    # 如果成功解析为字典，说明末尾是 JSON 对象
-                    if isinstance(parsed_json, dict):
-                        logger.debug(
-                            f"检测到思考内容末尾有 JSON 对象 - "
-                            f"JSON 长度: {len(json_str)}, "
-                            f"键: {list(parsed_json.keys())}"
-                        )
-                        return True
-                except json.JSONDecodeError:
-                    # JSON 解析失败，不是有效的 JSON
-                    pass
-                except Exception as e:
-                    logger.debug(f"解析 JSON 时发生异常: {e}")
+        # 末尾是非空 JSON 对象（有键值对），说明很可能是虚假的工具调用
+        json_start, parsed_json = _find_trailing_json_object(content)
+        if parsed_json:
+            # 键列表需要额外构造，只在 DEBUG 生效时才生成
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "检测到思考内容末尾有 JSON 对象 - "
+                    "JSON 长度: %s, "
+                    "键: %s",
+                    len(content) - json_start, list(parsed_json.keys())
+                )
+            return True
 
         return False
 
@@ -802,46 +1293,20 @@ class ReActAgent:
         if not content:
             return reasoning_content
 
-        # 首先尝试查找完整的 JSON 对象（从末尾开始）
-        # 找到最后一个 '}' 的位置
-        last_brace_pos = content.rfind("}")
-        if last_brace_pos != -1:
-            # 从最后一个 '}' 向前查找匹配的 '{'
-            brace_count = 1
-            json_start = -1
-            for i in range(last_brace_pos - 1, -1, -1):
-                if content[i] == "}":
-                    brace_count += 1
-                elif content[i] == "{":
-                    brace_count -= 1
-                    if brace_count == 0:
-                        json_start = i
-                        break
-
-            # 如果找到了匹配的 '{'，尝试解析 JSON
-            if json_start != -1:
-                json_str = content[json_start : last_brace_pos + 1]
-                # 检查 JSON 后面是否只有空白或换行
-                after_json = content[last_brace_pos + 1 :].strip()
-                if not after_json or after_json in ["\n", "\r\n"]:
-                    try:
-                        parsed_json = json.loads(json_str)
-                        # 如果成功解析为字典，移除这个 JSON 部分
-                        if isinstance(parsed_json, dict):
-                            # 移除 JSON 部分（包括前面的空白）
-                            cleaned = content[:json_start].rstrip()
-                            logger.debug(
-                                f"已移除思考内容末尾的完整 JSON 对象 - "
-                                f"JSON 长度: {len(json_str)}, "
-                                f"移除前长度: {len(content)}, "
-                                f"移除后长度: {len(cleaned)}"
-                            )
-                            return cleaned
-                    except json.JSONDecodeError:
-                        # JSON 解析失败，继续尝试查找不完整的 JSON
-                        pass
-                    except Exception as e:
-                        logger.debug(f"解析 JSON 时发生异常: {e}")
+        # 首先尝试查找末尾完整的 JSON 对象
+        if content.endswith("}"):
+            json_start, parsed_json = _find_trailing_json_object(content)
+            if parsed_json is not None:
+                # 移除 JSON 部分（包括前面的空白）
+                cleaned = content[:json_start].rstrip()
+                logger.debug(
+                    "已移除思考内容末尾的完整 JSON 对象 - "
+                    "JSON 长度: %s, "
+                    "移除前长度: %s, "
+                    "移除后长度: %s",
+                    len(content) - json_start, len(content), len(cleaned)
+                )
+                return cleaned
 
         # 如果没有找到完整的 JSON，尝试查找不完整的 JSON（从最后一个 '{' 开始到末尾）
         last_open_brace_pos = content.rfind("{")
@@ -851,16 +1316,15 @@ class ReActAgent:
             # 检查是否包含 JSON 特征：引号、冒号、键值对模式
             if '"' in json_part or "'" in json_part:
                 # 检查是否有键值对模式（如 "key": 或 'key':）
-                # 匹配 JSON 键值对模式：引号包围的键，后跟冒号
-                json_pattern = r'["\']\s*[^"\']+\s*["\']\s*:'
-                if re.search(json_pattern, json_part):
+                if _JSON_KEY_PATTERN.search(json_part):
                     # 这看起来像是不完整的 JSON，移除它
                     cleaned = content[:last_open_brace_pos].rstrip()
                     logger.debug(
-                        f"已移除思考内容末尾的不完整 JSON 对象 - "
-                        f"JSON 部分长度: {len(json_part)}, "
-                        f"移除前长度: {len(content)}, "
-                        f"移除后长度: {len(cleaned)}"
+                        "已移除思考内容末尾的不完整 JSON 对象 - "
+                        "JSON 部分长度: %s, "
+                        "移除前长度: %s, "
+                        "移除后长度: %s",
+                        len(json_part), len(content), len(cleaned)
                     )
                     return cleaned
 
@@ -879,23 +1343,88 @@ class ReActAgent:
         if not content:
             return content
 
+        # 绝大多数回复不含该标记：先做一次不区分大小写的子串查找，命中时才走正则。
+        # 标记以 a/A 开头，不含这两个字符的内容（如纯中文回复）连 lower() 的复制都可以省掉
+        stripped = content.strip()
+        if ("a" not in content and "A" not in content) or "assistantfinal" not in content.lower():
+            return stripped
+
         # 简单匹配并移除 assistantfinal 这个词
-        cleaned = re.sub(r"assistantfinal", "", content, flags=re.IGNORECASE)
-        cleaned = cleaned.strip()
+        cleaned = _ASSISTANT_FINAL_PATTERN.sub("", content).strip()
 
-        if cleaned != content.strip():
+        if cleaned != stripped:
             logger.debug(
-                f"已清理内容中的 'assistantfinal' - "
-                f"原始长度: {len(content)}, 清理后长度: {len(cleaned)}"
+                "已清理内容中的 'assistantfinal' - "
+                "原始长度: %s, 清理后长度: %s",
+                len(content), len(cleaned)
             )
 
         return cleaned
 
     def stop_chat(self) -> None:
-        """停止当前对话"""
+        """
+        停止当前对话
+
+        只设置 should_stop，由读取流的线程在下一个 chunk 检查到后自行关闭流。
+        不在调用线程直接关闭流：HTTP/2 连接池下跨线程 close() 不会中止读取，反而更慢
+        """
         logger.info("收到停止对话请求，设置 should_stop = True")
         self.should_stop = True
-        logger.debug(f"should_stop 已设置为: {self.should_stop}")
+        logger.debug("should_stop 已设置为: %s", self.should_stop)
+
+    def close(self) -> None:
+        """释放 Agent 持有的资源（工具线程池和 HTTP 连接池），应用退出时调用"""
+        tool_pool = self._tool_pool
+        if tool_pool is not None:
+            self._tool_pool = None
+            # 不等待仍在执行的工具，尚未开始的任务直接取消
+            tool_pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            self.http_client.close()
+        except Exception as e:
+            logger.debug("关闭 HTTP 客户端时发生异常: %s", e)
+        logger.info("Agent 资源已释放")
+
+    def _get_retry_delay(self, retry_count: int, error: Exception) -> float:
+        """
+        计算重试前的等待时间（指数退避 + 随机抖动，限流时优先遵循 Retry-After）
+
+        Args:
+            retry_count: 已重试次数（从 1 开始）
+            error: 本次失败的异常
+
+        Returns:
+            等待秒数
+        """
+        if isinstance(error, RateLimitError):
+            retry_after = error.response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(60.0, max(0.0, float(retry_after)))
+                except ValueError:
+                    logger.debug("无法解析 Retry-After 头: %s", retry_after)
+
+        return min(30.0, (2 ** retry_count) * 0.5) * (0.5 + random.random())
+
+    def _sleep_before_retry(self, delay: float) -> None:
+        """
+        重试前等待，等待期间响应用户中断
+
+        Args:
+            delay: 等待秒数
+
+        Raises:
+            InterruptedError: 等待期间用户请求停止
+        """
+        deadline = time.monotonic() + delay
+        while True:
+            if self.should_stop:
+                logger.info("API 调用被用户中断，停止重试")
+                raise InterruptedError("API 调用被用户中断")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(0.1, remaining))
 
     def _call_api_with_retry(
         self, max_retries: int = 3
@@ -917,10 +1446,11 @@ class ReActAgent:
         tools = self._get_tools()
 
         logger.info(
-            f"开始调用 API (第 {self.chat_count} 轮对话) - "
-            f"消息数: {len(messages)}, 工具数: {len(tools)}"
+            "开始调用 API (第 %s 轮对话) - "
+            "消息数: %s, 工具数: %s",
+            self.chat_count, len(messages), len(tools)
         )
-        logger.debug(f"API 请求参数: model={config.model}, temperature=0.7, top_p=0.8")
+        logger.debug("API 请求参数: model=%s, temperature=0.7, top_p=0.8", config.model)
 
         while retry_count < max_retries:
             # 在每次重试前检查是否应该停止
@@ -954,12 +1484,16 @@ class ReActAgent:
                         timeout=config.api_timeout,  # API 调用超时时间（秒）
                     )
                 )
-                logger.info(f"API 调用成功 (重试次数: {retry_count})")
+                logger.info("API 调用成功 (重试次数: %s)", retry_count)
                 return stream_response
             except InterruptedError:
                 # 如果是用户中断，直接抛出，不重试
                 logger.info("API 调用被用户中断")
                 raise InterruptedError("API 调用被用户中断")
+            except _FATAL_API_ERRORS as e:
+                # 请求本身有问题（鉴权失败、参数错误等），重试无意义，直接失败
+                logger.error("API 调用失败（不可重试）: %s", e, exc_info=True)
+                raise
             except Exception as e:
                 retry_count += 1
                 # 再次检查是否应该停止（可能在异常处理期间用户按了停止）
@@ -967,135 +1501,155 @@ class ReActAgent:
                     logger.info("API 调用被用户中断，停止重试")
                     raise InterruptedError("API 调用被用户中断")
                 logger.error(
-                    f"API 调用失败 (重试 {retry_count}/{max_retries}): {e}",
+                    "API 调用失败 (重试 %s/%s): %s",
+                    retry_count, max_retries, e,
                     exc_info=True,
                 )
                 if retry_count >= max_retries:
                     logger.error("API 调用失败: 已达到最大重试次数")
                     raise InterruptedError("API 调用失败: 已达到最大重试次数")
 
+                delay = self._get_retry_delay(retry_count, e)
+                if not isinstance(e, _RETRYABLE_API_ERRORS):
+                    logger.warning("未知类型的 API 异常，仍按可重试处理: %s", type(e).__name__)
+                logger.info("%.2f 秒后重试 API 调用", delay)
+                self._sleep_before_retry(delay)
+
         # 理论上不会到达这里
         raise RuntimeError("API 调用失败: 已达到最大重试次数")
 
-    def _get_current_reasoning(self) -> str:
-        """获取当前思考内容"""
-        return getattr(self, "_current_reasoning", "")
+    def _reset_stream_counters(self) -> None:
+        """重置当前流式响应的长度计数（思考内容只记录长度，完整文本由流处理方法自行累计）"""
+        self._reasoning_len = 0
+        self._content_len = 0
+        self._completion_tokens = 0.0
+        self._pending_status_parts = []
+
+    def _update_stream_status(
+        self,
+        delta_content: str,
+        status_callback: Optional[Callable[[], None]],
+        force: bool = False,
+    ) -> None:
+        """
+        根据新增内容更新估算的 token 并通知 UI（只统计增量，不拼接累计字符串）
+
+        流式响应每秒可能有上百个 chunk，新增内容先记下，估算和 UI 刷新按 _UI_UPDATE_INTERVAL 合并执行
 
-    def _set_current_reasoning(self, content: str) -> None:
-        """设置当前思考内容"""
-        self._current_reasoning = content
+        Args:
+            delta_content: 本次新增的内容
+            status_callback: 状态更新回调函数
+            force: 是否忽略时间间隔立即刷新
+        """
+        if delta_content:
+            self._pending_status_parts.append(delta_content)
+
+        now = time.monotonic()
+        if not force and now - self._last_ui_tick < _UI_UPDATE_INTERVAL:
+            return
+        self._last_ui_tick = now
+
+        if self._pending_status_parts:
+            self._completion_tokens += _estimate_text_tokens("".join(self._pending_status_parts))
+            self._pending_status_parts.clear()
 
-    def _clear_current_reasoning(self) -> None:
-        """清除当前思考内容"""
-        if hasattr(self, "_current_reasoning"):
-            delattr(self, "_current_reasoning")
+        self.message_manager.update_estimated_completion_tokens(self._completion_tokens)
+
+        # 通知UI更新状态
+        if status_callback:
+            status_callback()
 
     def _handle_reasoning_content(
         self,
         delta_content: str,
-        reasoning_content: str,
+        reasoning_parts: List[str],
         start_flag: bool,
-        content: str,
         output: Callable[[str, bool], None],
         status_callback: Optional[Callable[[], None]],
-    ) -> Tuple[str, bool]:
+    ) -> bool:
         """
         处理思考内容
 
         Args:
             delta_content: 增量思考内容
-            reasoning_content: 累计思考内容
+            reasoning_parts: 累计思考内容片段（流结束后再拼接）
             start_flag: 是否已开始输出思考内容
-            content: 当前回复内容
             output: 输出回调函数
             status_callback: 状态更新回调函数
 
         Returns:
-            (更新后的思考内容, 是否已开始标志)
+            是否已开始标志
         """
         if not start_flag:
             output(
-                f"\n{'='*config.log_separator_length} 模型思考 {'='*config.log_separator_length}\n"
+                _section_banner("模型思考", config.log_separator_length)
             )
             logger.debug("开始接收模型思考内容")
             start_flag = True
 
-        reasoning_content += delta_content
-        output(delta_content, end_newline=False)
+        reasoning_parts.append(delta_content)
+        output(delta_content, False)
 
-        # 更新思考内容追踪
-        current_reasoning = self._get_current_reasoning() + delta_content
-        self._set_current_reasoning(current_reasoning)
+        # 更新估算的 token 并通知UI更新状态
+        self._reasoning_len += len(delta_content)
+        self._update_stream_status(delta_content, status_callback)
 
-        # 更新估算的 token
-        total_completion = current_reasoning + content
-        self.message_manager.update_estimated_tokens(total_completion)
-
-        # 通知UI更新状态
-        if status_callback:
-            status_callback()
-
-        return reasoning_content, start_flag
+        return start_flag
 
     def _handle_assistant_content(
         self,
         delta_content: str,
-        content: str,
+        content_parts: List[str],
         start_flag: bool,
         output: Callable[[str, bool], None],
         status_callback: Optional[Callable[[], None]],
-    ) -> Tuple[str, bool]:
+    ) -> bool:
         """
         处理助手回复内容
 
         Args:
             delta_content: 增量回复内容
-            content: 累计回复内容
+            content_parts: 累计回复内容片段（流结束后再拼接）
             start_flag: 是否已开始输出回复内容
             output: 输出回调函数
             status_callback: 状态更新回调函数
 
         Returns:
-            (更新后的回复内容, 是否已开始标志)
+            是否已开始标志
         """
         if not start_flag:
             output(
-                f"\n{'='*config.log_separator_length} 最终回复 {'='*config.log_separator_length}\n"
+                _section_banner("最终回复", config.log_separator_length)
             )
             logger.debug("开始接收模型最终回复")
             start_flag = True
 
-        content += delta_content
-        output(delta_content, end_newline=False)
+        content_parts.append(delta_content)
+        output(delta_content, False)
 
-        # 更新估算的 token
-        self.message_manager.update_estimated_tokens(content)
-
-        # 通知UI更新状态
-        if status_callback:
-            status_callback()
+        # 更新估算的 token 并通知UI更新状态
+        self._content_len += len(delta_content)
+        self._update_stream_status(delta_content, status_callback)
 
-        return content, start_flag
+        return start_flag
 
     def _handle_tool_call_delta(
         self,
         tool_call: Any,
-        tool_call_acc: Dict[str, Dict[str, str]],
+        tool_call_acc: Dict[str, Dict[str, Any]],
         last_tool_call_id: Optional[str],
         start_flag: bool,
-        content: str,
         output: Callable[[str, bool], None],
         status_callback: Optional[Callable[[], None]],
-    ) -> Tuple[Dict[str, Dict[str, str]], Optional[str], bool]:
+    ) -> Tuple[Dict[str, Dict[str, Any]], Optional[str], bool]:
         """
         处理工具调用的增量数据
 
         Args:
             tool_call: 工具调用增量数据
-            tool_call_acc: 累计的工具调用数据
+            tool_call_acc: 累计的工具调用数据（名称和参数以片段列表保存，执行前再拼接）
             last_tool_call_id: 上一个工具调用ID
             start_flag: 是否已开始输出工具调用
-            content: 当前回复内容
             output: 输出回调函数
             status_callback: 状态更新回调函数
 
@@ -1104,7 +1658,7 @@ class ReActAgent:
         """
         if not start_flag:
             output(
-                f"\n{'='*config.log_separator_length} 工具调用 {'='*config.log_separator_length}\n"
+                _section_banner("工具调用", config.log_separator_length)
             )
             logger.info("开始接收工具调用")
             start_flag = True
@@ -1116,32 +1670,29 @@ class ReActAgent:
 
         last_tool_call_id = tc_id
 
-        if tc_id not in tool_call_acc:
-            tool_call_acc[tc_id] = {"id": tc_id, "name": "", "arguments": ""}
-            logger.debug(f"开始接收工具调用: ID={tc_id}")
+        # 每个 delta 只查找一次累计数据
+        tc_data = tool_call_acc.get(tc_id)
+        if tc_data is None:
+            tc_data = {"id": tc_id, "name_parts": [], "arg_parts": []}
+            tool_call_acc[tc_id] = tc_data
+            logger.debug("开始接收工具调用: ID=%s", tc_id)
 
+        # 只追加片段，避免每个 chunk 都重新拼接整个参数字符串
         if tool_call.function:
-            if tool_call.function.name:
-                tool_call_acc[tc_id]["name"] += tool_call.function.name
-                output(tool_call.function.name, end_newline=False)
-            if tool_call.function.arguments:
-                tool_call_acc[tc_id]["arguments"] += tool_call.function.arguments
-                output(tool_call.function.arguments, end_newline=False)
-
-        # 更新估算的 token
-        tool_call_text = ""
-        for acc_tc_data in tool_call_acc.values():
-            tool_call_text += acc_tc_data.get("name", "") + acc_tc_data.get(
-                "arguments", ""
-            )
-
-        current_reasoning = self._get_current_reasoning()
-        total_completion = current_reasoning + content + tool_call_text
-        self.message_manager.update_estimated_tokens(total_completion)
-
-        # 通知UI更新状态
-        if status_callback:
-            status_callback()
+            name_delta = tool_call.function.name
+            args_delta = tool_call.function.arguments
+            if name_delta:
+                tc_data["name_parts"].append(name_delta)
+                output(name_delta, False)
+            if args_delta:
+                tc_data["arg_parts"].append(args_delta)
+                output(args_delta, False)
+
+            # 绝大多数 chunk 只有参数片段，此时无需拼接
+            delta_text = name_delta + (args_delta or "") if name_delta else args_delta
+            if delta_text:
+                # 更新估算的 token 并通知UI更新状态
+                self._update_stream_status(delta_text, status_callback)
 
         return tool_call_acc, last_tool_call_id, start_flag
 
@@ -1150,7 +1701,7 @@ class ReActAgent:
         stream_response: Stream[ChatCompletionChunk],
         output: Callable[[str, bool], None],
         status_callback: Optional[Callable[[], None]],
-    ) -> Tuple[str, str, Dict[str, Dict[str, str]], Optional[Any]]:
+    ) -> Tuple[str, str, Dict[str, Dict[str, Any]], Optional[Any]]:
         """
         处理流式响应
 
@@ -1162,20 +1713,29 @@ class ReActAgent:
         Returns:
             (思考内容, 回复内容, 工具调用累计数据, usage信息)
         """
-        reasoning_content = "Thinking:\n"
-        content = ""
+        # 思考和回复内容按片段收集，流结束后一次性拼接，避免逐 chunk 拼接整个字符串
+        reasoning_parts: List[str] = ["Thinking:\n"]
+        content_parts: List[str] = []
         last_tool_call_id: Optional[str] = None
-        tool_call_acc: Dict[str, Dict[str, str]] = {}
+        tool_call_acc: Dict[str, Dict[str, Any]] = {}
         usage = None
 
         start_reasoning_content = False
         start_content = False
         start_tool_call = False
 
-        self._set_current_reasoning("")
+        self._reset_stream_counters()
+        self._last_ui_tick = 0.0
+        # 逐 token 的输出先进缓冲，按时间片合并后再交给 output
+        output = _OutputBuffer(output)
 
         logger.debug("开始处理流式响应")
 
+        # 循环内每个 chunk 都会调用的方法先绑定为局部变量，省去逐次的属性查找
+        handle_reasoning_content = self._handle_reasoning_content
+        handle_assistant_content = self._handle_assistant_content
+        handle_tool_call_delta = self._handle_tool_call_delta
+
         try:
             for chunk in stream_response:
 
@@ -1184,96 +1744,125 @@ class ReActAgent:
                     stream_response.close()
                     break
 
-                if hasattr(chunk, "usage") and chunk.usage is not None:
-                    usage = chunk.usage
+                # usage、content、tool_calls 都是 SDK 模型上声明的字段（缺省为 None），直接读取属性即可
+                chunk_usage = chunk.usage
+                if chunk_usage is not None:
+                    usage = chunk_usage
 
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
+                choices = chunk.choices
+                if choices:
+                    delta = choices[0].delta
 
                     # 优先处理 reasoning_content（deepseek 模型），如果不存在则处理 reasoning（gpt-oss 模型）
                     # 避免重复处理导致 token 重复
-                    reasoning_delta = None
-                    if hasattr(delta, "reasoning_content") and delta.reasoning_content:
-                        reasoning_delta = delta.reasoning_content
-                    elif hasattr(delta, "reasoning") and delta.reasoning:
-                        reasoning_delta = delta.reasoning
-                    
+                    # 这两个字段不在 SDK 的 ChoiceDelta 定义中，pydantic v2 下只会出现在 model_extra 里。
+                    # 不输出思考内容的模型 model_extra 为空字典，一次属性读取即可跳过，
+                    # 不必每个 chunk 都让 getattr 在属性缺失时走两次异常路径；
+                    # pydantic v1 没有 model_extra（导入时判断一次），额外字段直接是属性，回退到 getattr
+                    if _DELTA_HAS_MODEL_EXTRA:
+                        extra = delta.model_extra
+                        reasoning_delta = (
+                            extra.get("reasoning_content") or extra.get("reasoning") if extra else None
+                        )
+                    else:
+                        reasoning_delta = getattr(delta, "reasoning_content", None) or getattr(
+                            delta, "reasoning", None
+                        )
+
                     if reasoning_delta:
-                        reasoning_content, start_reasoning_content = (
-                            self._handle_reasoning_content(
-                                reasoning_delta,
-                                reasoning_content,
-                                start_reasoning_content,
-                                content,
-                                output,
-                                status_callback,
-                            )
+                        start_reasoning_content = handle_reasoning_content(
+                            reasoning_delta,
+                            reasoning_parts,
+                            start_reasoning_content,
+                            output,
+                            status_callback,
                         )
 
-                    if hasattr(delta, "content") and delta.content:
-                        content, start_content = self._handle_assistant_content(
-                            delta.content,
-                            content,
+                    content_delta = delta.content
+                    if content_delta:
+                        start_content = handle_assistant_content(
+                            content_delta,
+                            content_parts,
                             start_content,
                             output,
                             status_callback,
                         )
 
-                    if hasattr(delta, "tool_calls") and delta.tool_calls:
-                        for tc in delta.tool_calls:
+                    tool_call_deltas = delta.tool_calls
+                    if tool_call_deltas:
+                        for tc in tool_call_deltas:
+                            # 用户已中断时不再处理本 chunk 中剩余的工具调用片段
+                            if self.should_stop:
+                                break
+                            # 既没有 ID 也没有名称/参数片段的 delta（如只带 index 的保活片段）无需处理
+                            tc_function = tc.function
+                            if not tc.id and not (
+                                tc_function and (tc_function.name or tc_function.arguments)
+                            ):
+                                continue
                             tool_call_acc, last_tool_call_id, start_tool_call = (
-                                self._handle_tool_call_delta(
+                                handle_tool_call_delta(
                                     tc,
                                     tool_call_acc,
                                     last_tool_call_id,
                                     start_tool_call,
-                                    content,
                                     output,
                                     status_callback,
                                 )
                             )
 
+                # 处理完本 chunk 后再检查一次，用户已中断时立即关闭流，不必等到下一个 chunk 到达
+                if self.should_stop:
+                    logger.info("流式响应处理被用户中断，正在关闭流...")
+                    stream_response.close()
+                    break
+
         except Exception as e:
             error_msg = str(e)
             logger.error(
-                f"处理流式响应时发生异常: {error_msg}",
+                "处理流式响应时发生异常: %s",
+                error_msg,
                 exc_info=True
             )
             
             # 如果是 OpenAI API 错误，记录更多信息
             if "unexpected tokens" in error_msg.lower() or "message header" in error_msg.lower():
                 logger.error(
-                    f"检测到消息格式错误 - "
-                    f"当前消息历史长度: {len(self.message_manager.messages)}, "
-                    f"错误详情: {error_msg}"
+                    "检测到消息格式错误 - "
+                    "当前消息历史长度: %s, "
+                    "错误详情: %s",
+                    self.message_manager.message_count, error_msg
                 )
                 # 记录最后几条消息用于调试
-                try:
-                    recent_messages = self.message_manager.messages[-5:]
-                    logger.debug(
-                        f"最近的消息历史: {json.dumps(recent_messages, indent=2, ensure_ascii=False)}"
-                    )
-                except Exception:
-                    pass
+                if logger.isEnabledFor(logging.DEBUG):
+                    try:
+                        recent_messages = self.message_manager.tail(5)
+                        logger.debug("最近的消息历史: %s", _LazyJson(recent_messages))
+                    except Exception:
+                        pass
             
             # 所有异常都向上抛出，由 chat 方法统一处理重试逻辑
-            if not self.should_stop:
-                raise
+            raise
         finally:
+            output.close()
             try:
                 stream_response.close()
                 logger.debug("流式响应已关闭")
             except Exception:
                 pass
 
+        # 流结束时补一次被合并掉的状态刷新
+        self._update_stream_status("", status_callback, force=True)
+
         logger.debug(
-            f"流式响应处理完成 - "
-            f"思考长度: {len(reasoning_content)}, "
-            f"回复长度: {len(content)}, "
-            f"工具调用数: {len(tool_call_acc)}"
+            "流式响应处理完成 - "
+            "思考长度: %s, "
+            "回复长度: %s, "
+            "工具调用数: %s",
+            self._reasoning_len, self._content_len, len(tool_call_acc)
         )
 
-        return reasoning_content, content, tool_call_acc, usage
+        return "".join(reasoning_parts), "".join(content_parts), tool_call_acc, usage
 
 
     def _update_token_usage(
@@ -1288,42 +1877,55 @@ class ReActAgent:
         """
         if not usage:
             logger.warning("流式响应中未找到 usage 信息")
-            self._clear_current_reasoning()
+            self._reset_stream_counters()
             return
 
         prompt_tokens = getattr(usage, "prompt_tokens", None)
         if prompt_tokens is None:
             logger.warning("API 响应中未找到 prompt_tokens")
-            self._clear_current_reasoning()
+            self._reset_stream_counters()
             return
 
+        # Anthropic 风格的兼容接口把缓存写入/命中的 token 单独计数，不包含在 prompt_tokens 中，
+        # 需要累加才是实际占用的上下文；OpenAI 的 cached_tokens 已计入 prompt_tokens，无需处理
+        cache_creation_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        if cache_creation_tokens or cache_read_tokens:
+            logger.debug(
+                "usage 中包含缓存 token - 写入: %s, 命中: %s",
+                cache_creation_tokens, cache_read_tokens
+            )
+            prompt_tokens += cache_creation_tokens + cache_read_tokens
+
         completion_tokens = getattr(usage, "completion_tokens", 0)
         total_tokens = getattr(usage, "total_tokens", 0)
 
         self.message_manager.update_token_usage(prompt_tokens)
-        self._clear_current_reasoning()
+        self._reset_stream_counters()
 
         usage_percent = self.message_manager.get_token_usage_percent()
         logger.info(
-            f"Token 使用量更新 - "
-            f"prompt: {prompt_tokens}, "
-            f"completion: {completion_tokens}, "
-            f"total: {total_tokens}, "
-            f"使用率: {usage_percent:.2f}%"
+            "Token 使用量更新 - "
+            "prompt: %s, "
+            "completion: %s, "
+            "total: %s, "
+            "使用率: %.2f%%",
+            prompt_tokens, completion_tokens, total_tokens, usage_percent
         )
 
         # 如果使用率达到 80%，记录警告（模型应该主动总结）
         if usage_percent >= 80.0:
             logger.warning(
-                f"当前段使用率已达到 {usage_percent:.2f}%，"
-                f"模型应该在下次回复中主动总结上下文"
+                "当前段使用率已达到 %.2f%%，"
+                "模型应该在下次回复中主动总结上下文",
+                usage_percent
             )
 
         if status_callback:
             status_callback()
 
     def _execute_tool_calls(
-        self, tool_call_acc: Dict[str, Dict[str, str]]
+        self, tool_call_acc: Dict[str, Dict[str, Any]]
     ) -> None:
         """
         执行工具调用
@@ -1331,87 +1933,141 @@ class ReActAgent:
         Args:
             tool_call_acc: 工具调用累计数据
         """
-        logger.info(f"开始执行 {len(tool_call_acc)} 个工具调用")
+        logger.info("开始执行 %s 个工具调用", len(tool_call_acc))
 
-        for tc_id, tc_data in tool_call_acc.items():
+        # 流式阶段只保存了片段，这里一次性拼接
+        calls = [
+            (tc_id, "".join(tc_data["name_parts"]), "".join(tc_data["arg_parts"]))
+            for tc_id, tc_data in tool_call_acc.items()
+        ]
+        prefetched = self._prefetch_read_only_tool_calls(calls)
+
+        # 每个工具执行完后只记录 (调用, 结果)，整轮结束（包括中途被中断）时一次性写入消息历史，
+        # 这样历史中不会出现没有结果的工具调用；summarize_context 创建新段后，
+        # 本轮的调用和结果也会一起落在新段中
+        round_records: List[Tuple[str, str, str, str]] = []
+        try:
+            self._run_tool_calls(calls, prefetched, round_records)
+        finally:
+            self.message_manager.add_tool_round(round_records)
+
+    def _run_tool_calls(
+        self,
+        calls: List[Tuple[str, str, str]],
+        prefetched: Dict[str, "Future[dict]"],
+        round_records: List[Tuple[str, str, str, str]],
+    ) -> None:
+        """
+        依次执行工具调用，并把 (工具调用 ID, 工具名称, 参数, 结果) 追加到 round_records
+
+        Args:
+            calls: (工具调用 ID, 工具名称, 参数字符串) 列表
+            prefetched: 已提交并行执行的只读工具调用
+            round_records: 用于收集本轮调用及结果的列表
+        """
+        for tc_id, tool_name, tool_args in calls:
             # 检查是否应该停止（在执行每个工具之前）
             if self.should_stop:
                 logger.info("工具执行被用户中断，停止执行剩余工具")
                 return
-            
-            tool_name = tc_data["name"]
-            tool_args = tc_data["arguments"]
 
             logger.info(
-                f"执行工具调用 - ID: {tc_id}, 工具: {tool_name}, "
-                f"参数长度: {len(tool_args)}"
+                "执行工具调用 - ID: %s, 工具: %s, "
+                "参数长度: %s",
+                tc_id, tool_name, len(tool_args)
             )
-            logger.debug(f"工具调用参数: {tool_args}")
-
-            # 添加到消息历史
-            self.message_manager.add_assistant_tool_call(tc_id, tool_name, tool_args)
+            logger.debug("工具调用参数: %s", tool_args)
 
             # 执行工具
             try:
-                tool_call_result = self.tool_executor.execute(tool_name, tool_args)
-                
-                # 执行后再次检查是否应该停止（不执行后续工具）
-                if self.should_stop:
-                    logger.info("工具执行后被用户中断，停止执行剩余工具")
-                    return
+                future = prefetched.get(tc_id)
+                if future is not None:
+                    tool_call_result = future.result()
+                else:
+                    parsed_args = _parse_tool_args(tool_args)
+                    tool_call_result = self.tool_executor.execute(tool_name, parsed_args)
 
-                # 处理返回结果
+                # 处理返回结果（执行后被中断时也保留结果，下一次循环开头会停止执行后续工具）
                 if isinstance(tool_call_result, dict):
-                    result_content = json.dumps(
-                        tool_call_result, ensure_ascii=False, indent=2
-                    )
+                    # 结果只回传给模型，使用紧凑格式：缩进和空格既拖慢序列化也白白占用 token
+                    result_content = _dumps(tool_call_result)
                     is_success = tool_call_result.get("success", False)
-                    tool_result = tool_call_result.get("result", "")
                     tool_error = tool_call_result.get("error")
 
                     if is_success:
                         logger.info(
-                            f"工具执行成功 - ID: {tc_id}, 工具: {tool_name}, "
-                            f"结果长度: {len(str(tool_result))}"
+                            "工具执行成功 - ID: %s, 工具: %s, "
+                            "结果长度: %s",
+                            tc_id, tool_name, len(result_content)
                         )
                         # 如果是总结上下文工具，输出提示信息
                         if tool_name == "summarize_context":
                             logger.info("上下文总结工具执行成功，已创建新对话段")
                     else:
                         logger.error(
-                            f"工具执行失败 - ID: {tc_id}, 工具: {tool_name}, "
-                            f"错误: {tool_error}"
+                            "工具执行失败 - ID: %s, 工具: %s, "
+                            "错误: %s",
+                            tc_id, tool_name, tool_error
                         )
                 else:
                     # 兼容旧格式
                     result_content = tool_call_result
                     is_success = True
                     logger.info(
-                        f"工具执行完成 - ID: {tc_id}, 工具: {tool_name} "
-                        f"(旧格式返回)"
+                        "工具执行完成 - ID: %s, 工具: %s "
+                        "(旧格式返回)",
+                        tc_id, tool_name
                     )
 
-                # 添加到消息历史
-                self.message_manager.add_assistant_tool_call_result(
-                    tc_id, result_content
-                )
+                # 记录调用及结果（保留模型原始输出的参数字符串）
+                round_records.append((tc_id, tool_name, tool_args, result_content))
 
             except Exception as e:
                 logger.error(
-                    f"执行工具时发生异常 - ID: {tc_id}, 工具: {tool_name}: {e}",
+                    "执行工具时发生异常 - ID: %s, 工具: %s: %s",
+                    tc_id, tool_name, e,
                     exc_info=True,
                 )
                 # 即使异常也要添加到消息历史
-                error_result = json.dumps(
-                    {"success": False, "result": None, "error": str(e)},
-                    ensure_ascii=False,
-                )
-                self.message_manager.add_assistant_tool_call_result(
-                    tc_id, error_result
-                )
+                error_result = _dumps({"success": False, "result": None, "error": str(e)})
+                round_records.append((tc_id, tool_name, tool_args, error_result))
 
         logger.info("所有工具调用执行完成")
 
+    def _prefetch_read_only_tool_calls(
+        self, calls: List[Tuple[str, str, str]]
+    ) -> Dict[str, "Future[dict]"]:
+        """
+        一轮中有多个工具调用且全部为只读工具时，提交到线程池并行执行
+
+        含有写文件、执行命令等工具时保持顺序执行，避免改变副作用的先后顺序。
+        结果仍由调用方按原始顺序写入消息历史。线程数取自 config.tool_parallelism
+        （线程池首次创建时确定），小于 2 时始终顺序执行。
+
+        Args:
+            calls: (工具调用 ID, 工具名称, 参数字符串) 列表
+
+        Returns:
+            工具调用 ID 到执行结果 Future 的映射；不满足并行条件时为空字典
+        """
+        if config.tool_parallelism < 2 or len(calls) < 2 or not all(
+            self.tool_executor.is_read_only(tool_name) for _, tool_name, _ in calls
+        ):
+            return {}
+
+        if self._tool_pool is None:
+            self._tool_pool = ThreadPoolExecutor(
+                max_workers=config.tool_parallelism, thread_name_prefix="tool"
+            )
+
+        logger.info("%s 个只读工具调用并行执行", len(calls))
+        return {
+            tc_id: self._tool_pool.submit(
+                self.tool_executor.execute, tool_name, _parse_tool_args(tool_args)
+            )
+            for tc_id, tool_name, tool_args in calls
+        }
+
     def _handle_final_response(
         self,
         reasoning_content: str,
@@ -1432,22 +2088,19 @@ class ReActAgent:
         # 检测虚假工具调用（仅在 gpt-oss 模型上启用）
         if self._is_gpt_oss_model() and self._detect_fake_tool_call_in_reasoning(reasoning_content):
             logger.warning(
-                f"检测到思考内容中有虚假的工具调用 - "
-                f"思考长度: {len(reasoning_content)}, "
-                f"回复长度: {len(content)}"
+                "检测到思考内容中有虚假的工具调用 - "
+                "思考长度: %s, "
+                "回复长度: %s",
+                len(reasoning_content), len(content)
             )
 
             # 保存内容
-            if reasoning_content.strip():
-                self.message_manager.add_assistant_reasoning(reasoning_content)
-            if content.strip():
-                cleaned_content = self._clean_content(content)
-                self.message_manager.add_assistant_content(cleaned_content)
+            self._save_response_content(reasoning_content, content)
 
             # 添加提示消息（使用清理后的思考内容，移除 JSON 部分）
-            cleaned_reasoning = self._remove_json_from_reasoning(reasoning_content)
-            if cleaned_reasoning.strip():
-                self.message_manager.add_assistant_content(cleaned_reasoning.strip())
+            cleaned_reasoning = self._remove_json_from_reasoning(reasoning_content).strip()
+            if cleaned_reasoning:
+                self.message_manager.add_assistant_content(cleaned_reasoning)
             else:
                 # 如果清理后为空，使用默认提示消息
                 fake_call_message = (
@@ -1462,18 +2115,34 @@ class ReActAgent:
             return True  # 继续循环
 
         # 保存最终回复
-        if reasoning_content.strip():
-            self.message_manager.add_assistant_reasoning(reasoning_content)
-            logger.debug(f"已保存思考内容，长度: {len(reasoning_content)}")
-
-        if content.strip():
-            cleaned_content = self._clean_content(content)
-            self.message_manager.add_assistant_content(cleaned_content)
-            logger.info(f"已保存最终回复，长度: {len(cleaned_content)}")
+        cleaned_content = self._save_response_content(reasoning_content, content)
+        if cleaned_content:
+            logger.info("已保存最终回复，长度: %s", len(cleaned_content))
 
         logger.info("最终回复处理完成，结束对话轮次")
         return False  # 结束循环
 
+    def _save_response_content(self, reasoning_content: str, content: str) -> str:
+        """
+        将本轮的思考内容和清理后的回复内容保存到消息历史（每段内容只 strip/清理一次）
+
+        Args:
+            reasoning_content: 思考内容
+            content: 回复内容
+
+        Returns:
+            清理后的回复内容（为空表示没有保存回复）
+        """
+        stripped_reasoning = reasoning_content.strip()
+        if stripped_reasoning:
+            self.message_manager.add_assistant_reasoning(stripped_reasoning)
+            logger.debug("已保存思考内容，长度: %s", len(stripped_reasoning))
+
+        cleaned_content = self._clean_content(content)
+        if cleaned_content:
+            self.message_manager.add_assistant_content(cleaned_content)
+        return cleaned_content
+
     def _handle_user_interruption(
         self,
         reasoning_content: str,
@@ -1491,17 +2160,11 @@ class ReActAgent:
         logger.info("处理用户中断请求")
 
         # 保存部分内容
-        if reasoning_content.strip():
-            self.message_manager.add_assistant_reasoning(reasoning_content)
-        if content.strip():
-            cleaned_content = self._clean_content(content)
-            self.message_manager.add_assistant_content(cleaned_content)
+        if self._save_response_content(reasoning_content, content):
             logger.debug("已保存中断前的部分内容")
 
         # 添加系统消息
-        self.message_manager.messages.append(
-            {"role": "system", "content": "[用户在此处中断了对话，未完成的任务已暂停]"}
-        )
+        self.message_manager.add_system_message("[用户在此处中断了对话，未完成的任务已暂停]")
         output("\n\n[对话已被用户中断]", end_newline=True)
         logger.info("已将用户中断信息添加到上下文")
 
@@ -1520,42 +2183,44 @@ class ReActAgent:
                             如果提供，将使用回调而不是 print
             status_callback: 可选的状态更新回调函数，用于实时更新UI状态（如token使用量）
         """
-        logger.info(f"开始处理用户任务 - 消息长度: {len(task_message)}")
-        logger.debug(f"用户任务内容: {task_message[:200]}...")
+        logger.info("开始处理用户任务 - 消息长度: %s", len(task_message))
+        logger.debug("用户任务内容: %s...", task_message[:200])
 
         # 重置中断标志
         self.should_stop = False
 
-        # 定义输出函数
-        def output(text: str, end_newline: bool = True) -> None:
-            if output_callback:
+        # 两次对话之间用户可能修改了工作区文件，工具结果缓存只在单次对话内有效
+        self.tool_executor.clear_cache()
+
+        # 定义输出函数（是否有回调只判断一次，不在每次输出时判断）
+        if output_callback:
+            def output(text: str, end_newline: bool = True) -> None:
                 output_callback(text, end_newline)
-            else:
+        else:
+            def output(text: str, end_newline: bool = True) -> None:
                 print(text, end="\n" if end_newline else "", flush=True)
 
         # 添加用户消息
         self.message_manager.add_user_message(task_message)
         logger.debug("已添加用户消息到消息历史")
 
-        # 重置思考内容追踪
-        self._clear_current_reasoning()
+        # 重置流式响应计数
+        self._reset_stream_counters()
 
         # 主循环
         while True:
             # 检查中断
             if self.should_stop:
                 logger.info("对话在主循环被用户中断")
-                self.message_manager.messages.append(
-                    {"role": "system", "content": "[对话已被用户中断]"}
-                )
+                self.message_manager.add_system_message("[对话已被用户中断]")
                 output("\n\n[对话已被用户中断]", end_newline=True)
                 break
 
             self.chat_count += 1
-            logger.info(f"=== 开始第 {self.chat_count} 轮对话 ===")
-            logger.debug(
-                f"当前消息历史: {json.dumps(self.message_manager.get_messages(), indent=2, ensure_ascii=False)}"
-            )
+            logger.info("=== 开始第 %s 轮对话 ===", self.chat_count)
+            # 使用增量维护的序列化记录，不必每轮重新 dumps 整个消息历史
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("当前消息历史: %s", self.message_manager.get_serialized_log())
 
             # 调用 API
             try:
@@ -1566,7 +2231,7 @@ class ReActAgent:
                 output("\n\n[API 调用已被用户中断]", end_newline=True)
                 break
             except Exception as e:
-                logger.error(f"API 调用失败，无法继续: {e}", exc_info=True)
+                logger.error("API 调用失败，无法继续: %s", e, exc_info=True)
                 error_msg = (
                     "\n=== 错误信息 ===\n"
                     f"API 调用失败: {e}\n"
@@ -1583,16 +2248,16 @@ class ReActAgent:
             except httpx.TimeoutException as e:
                 # 网络超时错误（包括 ReadTimeout, ConnectTimeout, WriteTimeout, PoolTimeout）
                 # 记录日志但不显示给用户，直接重试
-                logger.warning(f"流式响应读取超时，将自动重试: {type(e).__name__}: {e}")
+                logger.warning("流式响应读取超时，将自动重试: %s: %s", type(e).__name__, e)
                 continue
             except Exception as e:
                 # 其他可重试的错误（如网络连接错误）
                 error_msg = str(e).lower()
                 if any(keyword in error_msg for keyword in ["timeout", "connection", "network", "read timeout"]):
-                    logger.warning(f"流式响应处理出错，将自动重试: {e}")
+                    logger.warning("流式响应处理出错，将自动重试: %s", e)
                     continue
                 # 其他严重错误，记录并重试（不显示给用户）
-                logger.error(f"处理流式响应时发生异常，将自动重试: {e}", exc_info=True)
+                logger.error("处理流式响应时发生异常，将自动重试: %s", e, exc_info=True)
                 continue
 
             # 处理用户中断
@@ -1095,6 +1095,11 @@ class ConfigEditScreen(ModalScreen[bool]):
                     with Horizontal(classes="config-row config-row-api_timeout"):
                         yield Static("API超时(秒)", classes="config-label")
                         yield Input(value="30", classes="config-input", id="config-api_timeout")
+                    
+                    # 工具配置
+                    with Horizontal(classes="config-row config-row-tool_parallelism"):
+                        yield Static("工具并行数", classes="config-label")
+                        yield Input(value="4", classes="config-input", id="config-tool_parallelism")
     
     def on_mount(self) -> None:
         """挂载时加载配置"""
@@ -2152,7 +2157,7 @@ class ReActAgentApp(App):
             self._scroll_to_bottom()
             import logging
             logger = logging.getLogger(__name__)
-            logger.error(f"导出消息失败: {e}", exc_info=True)
+            logger.error("导出消息失败: %s", e, exc_info=True)
     
     @on(ChatInput.Submitted)
     def on_chat_input_submitted(self, event: ChatInput.Submitted) -> None:
@@ -2222,31 +2227,34 @@ class ReActAgentApp(App):
             def output_callback(text: str, end_newline: bool = True) -> None:
                 nonlocal current_section, current_content
                 
-                # 过滤掉规划相关的输出（这些会显示在 header 中）
-                if any(keyword in text for keyword in ["Task Analysis", "执行计划", "开始执行", "任务完成", "已完成", "步骤失败"]):
-                    return
+                # 规划输出和横幅都是整行输出（end_newline=True）；不换行的输出是合并后的
+                # 模型流式内容，其中出现的同样词语（如"已完成"、"工具调用"）必须原样显示
+                if end_newline:
+                    # 过滤掉规划相关的输出（这些会显示在 header 中）
+                    if any(keyword in text for keyword in ["Task Analysis", "执行计划", "开始执行", "任务完成", "已完成", "步骤失败"]):
+                        return
                 
-                if "模型思考" in text:
-                    # 内容已经通过流式更新显示在 current_message_widget 中了
-                    # 只需要清空引用，准备下一个 section
-                    current_content = ""
-                    app.call_from_thread(lambda: setattr(app, 'current_message_widget', None))
-                    current_section = "reasoning"
-                    return
-                elif "最终回复" in text:
-                    # 内容已经通过流式更新显示在 current_message_widget 中了
-                    # 只需要清空引用，准备下一个 section
-                    current_content = ""
-                    app.call_from_thread(lambda: setattr(app, 'current_message_widget', None))
-                    current_section = "content"
-                    return
-                elif "工具调用" in text:
-                    # 内容已经通过流式更新显示在 current_message_widget 中了
-                    # 只需要清空引用，准备下一个 section
-                    current_content = ""
-                    app.call_from_thread(lambda: setattr(app, 'current_message_widget', None))
-                    current_section = "tool"
-                    return
+                    if "模型思考" in text:
+                        # 内容已经通过流式更新显示在 current_message_widget 中了
+                        # 只需要清空引用，准备下一个 section
+                        current_content = ""
+                        app.call_from_thread(lambda: setattr(app, 'current_message_widget', None))
+                        current_section = "reasoning"
+                        return
+                    elif "最终回复" in text:
+                        # 内容已经通过流式更新显示在 current_message_widget 中了
+                        # 只需要清空引用，准备下一个 section
+                        current_content = ""
+                        app.call_from_thread(lambda: setattr(app, 'current_message_widget', None))
+                        current_section = "content"
+                        return
+                    elif "工具调用" in text:
+                        # 内容已经通过流式更新显示在 current_message_widget 中了
+                        # 只需要清空引用，准备下一个 section
+                        current_content = ""
+                        app.call_from_thread(lambda: setattr(app, 'current_message_widget', None))
+                        current_section = "tool"
+                        return
                 
                 if current_section:
                     current_content += text
@@ -2360,7 +2368,7 @@ class ReActAgentApp(App):
             # 保存失败不影响正常使用
             import logging
             logger = logging.getLogger(__name__)
-            logger.debug(f"保存历史记录失败: {e}")
+            logger.debug("保存历史记录失败: %s", e)
     
     def _open_config_editor(self) -> None:
         """打开配置编辑界面"""
@@ -2784,7 +2792,7 @@ Title:"""
                 # 如果生成失败，使用默认标题或用户消息的前几个字
                 import logging
                 logger = logging.getLogger(__name__)
-                logger.debug(f"Failed to generate title: {e}")
+                logger.debug("Failed to generate title: %s", e)
                 fallback_title = first_message[:15] if len(first_message) > 0 else "新对话"
                 app.call_from_thread(lambda: self._update_chat_title(fallback_title))
         
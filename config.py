@@ -71,6 +71,7 @@ class Config:
             "user_language_preference": "简体中文",
             "log_separator_length": "20",
             "api_timeout": "30",  # API 调用超时时间（秒）
+            "tool_parallelism": "4",  # 只读工具调用的最大并行数（1 表示顺序执行）
         }
     
     def _load_config_file(self) -> Dict[str, Any]:
@@ -226,6 +227,12 @@ class Config:
             config_dict, "api_timeout", "API_TIMEOUT", "30"
         )
         self.api_timeout: float = float(api_timeout_value)
+        
+        # 工具并行配置
+        tool_parallelism_value = self._get_config_value(
+            config_dict, "tool_parallelism", "TOOL_PARALLELISM", "4"
+        )
+        self.tool_parallelism: int = int(tool_parallelism_value)
     
     def save_config_file(self, config_dict: Dict[str, Any]) -> bool:
         """保存配置到文件
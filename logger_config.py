@@ -1,14 +1,32 @@
 # -*- coding: utf-8 -*-
 """日志配置模块"""
 
+import atexit
 import logging
+import queue
 import sys
 import os
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from typing import Optional
 
 
+# 后台写日志的监听线程（日志处理器在该线程中执行文件 I/O，不阻塞流式输出等调用方）
+_queue_listener: Optional[QueueListener] = None
+
+
+def _stop_queue_listener() -> None:
+    """停止后台日志线程，并写出队列中剩余的日志"""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+atexit.register(_stop_queue_listener)
+
+
 def get_log_dir() -> Path:
     """获取日志目录路径"""
     # 如果是 PyInstaller 打包后的可执行文件
@@ -57,13 +75,18 @@ def setup_logging(log_file: Optional[str] = None, enable_console: bool = False)
     Note:
         始终记录 DEBUG 级别的日志到文件
         控制台输出默认关闭，避免干扰 Textual TUI 界面
+        根 logger 只挂一个 QueueHandler，实际的写入由后台线程完成
     """
+    global _queue_listener
+    
     # 创建根 logger（始终设置为 DEBUG）
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG)
     
-    # 清除已有的处理器
+    # 清除已有的处理器（重复调用时先停止旧的后台日志线程）
+    _stop_queue_listener()
     root_logger.handlers.clear()
+    handlers = []
     
     # 控制台处理器（仅在需要时启用）
     if enable_console:
@@ -77,7 +100,7 @@ def setup_logging(log_file: Optional[str] = None, enable_console: bool = False)
         )
         
         console_handler.setFormatter(formatter)
-        root_logger.addHandler(console_handler)
+        handlers.append(console_handler)
     
     # 创建 logs 目录
     log_dir = get_log_dir()
@@ -97,7 +120,13 @@ def setup_logging(log_file: Optional[str] = None, enable_console: bool = False)
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     file_handler.setFormatter(file_formatter)
-    root_logger.addHandler(file_handler)
+    handlers.append(file_handler)
+    
+    # 通过队列交给后台线程写出
+    log_queue = queue.SimpleQueue()
+    _queue_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+    root_logger.addHandler(QueueHandler(log_queue))
     
     return str(actual_log_file)
 
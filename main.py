@@ -60,7 +60,10 @@ def run_interactive_session(
     """
     # 创建 Textual 应用
     app = ReActAgentApp(agent, command_processor)
-    app.run()
+    try:
+        app.run()
+    finally:
+        agent.close()
 
 
 def main():
@@ -15,6 +15,7 @@ Last Updated: 2026-01-29
 """
 
 from datetime import datetime
+from functools import lru_cache
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -33,15 +34,20 @@ def _identity(config: "Config") -> str:
     <model>{config.model}</model>
     <os>{config.operating_system}</os>
     <workspace>{config.work_dir}</workspace>
-    <time>{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</time>
     <language>{config.user_language_preference}</language>
   </environment>
 </identity>"""
 
 
+def _current_time() -> str:
+    """当前时间单独放在提示词末尾，使前面的内容在多次会话间保持一致，便于服务端前缀缓存命中"""
+    return f"""<current_time>{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</current_time>"""
+
+
 # ============================================================
 # 模块 1.1: 工具调用
 # ============================================================
+@lru_cache(maxsize=1)
 def _tool_calling(tools_names: str) -> str:
     return f"""<tool_calling>
   <description>你可以使用工具来完成编程任务，需遵循以下规则</description>
@@ -1086,6 +1092,24 @@ def _debug_mode() -> str:
 # 组装器
 # ============================================================
 
+@lru_cache(maxsize=1)
+def _static_sections() -> str:
+    """不依赖配置、时间和工具列表的模块，内容固定，只拼接一次"""
+    return "\n\n".join([
+        _objectives(),
+        _constraints(),
+        _idle_state(),
+        _fast_path(),
+        _workflow_phases(),
+        _error_handling(),
+        _performance_optimization(),
+        _context_management(),
+        _output_format(),
+        _meta_rules(),
+        _debug_mode(),
+    ])
+
+
 def get_system_prompt_by_cn(config: "Config", tools_names: str) -> str:
     """
     基于 Anthropic 提示词工程规范：
@@ -1104,26 +1128,8 @@ def get_system_prompt_by_cn(config: "Config", tools_names: str) -> str:
 
 {_tool_calling(tools_names)}
 
-{_objectives()}
-
-{_constraints()}
-
-{_idle_state()}
-
-{_fast_path()}
-
-{_workflow_phases()}
-
-{_error_handling()}
-
-{_performance_optimization()}
-
-{_context_management()}
-
-{_output_format()}
-
-{_meta_rules()}
+{_static_sections()}
 
-{_debug_mode()}
+{_current_time()}
 
 </system_prompt>"""
@@ -31,6 +31,12 @@ hiddenimports = [
     'openai.resources.chat',
     'openai._client',
     'openai._streaming',
+    # HTTP/2 支持
+    'h2',
+    # 可选：token 估算（编码通过 tiktoken_ext 插件动态加载，需显式包含）
+    'tiktoken',
+    'tiktoken_ext',
+    'tiktoken_ext.openai_public',
     # 本地模块
     'config',
     'logger_config',
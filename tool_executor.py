@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
 """安全的工具执行器"""
 
+import hashlib
 import json
 import logging
-from typing import Dict, Any, List, Optional, Callable
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Union
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时回退到标准库 json
+    orjson = None
 
 from tools import Tool
 
 logger = logging.getLogger(__name__)
 
+# 工具结果缓存的最大条目数
+_RESULT_CACHE_SIZE = 256
+
 
 class ToolExecutor:
     """安全的工具执行器，替代 eval()"""
@@ -23,29 +34,72 @@ class ToolExecutor:
         """
         self.tools = tools
         self.should_stop_check = should_stop_check
+        # 可缓存工具的结果缓存（LRU），键为工具名与规范化参数的哈希
+        self._result_cache: "OrderedDict[bytes, dict]" = OrderedDict()
+        # 只读工具可能被并行执行，缓存读写需要加锁
+        self._cache_lock = threading.Lock()
         # 将检查函数传递给所有工具
         for tool in self.tools.values():
             tool.set_should_stop_check(should_stop_check)
 
-    def execute(self, tool_name: str, parameters: str = "") -> dict:
+    def clear_cache(self) -> None:
+        """清空工具结果缓存"""
+        with self._cache_lock:
+            self._result_cache.clear()
+
+    def is_read_only(self, tool_name: str) -> bool:
+        """
+        判断工具是否只读（只读工具之间可以安全地并行执行）
+
+        Args:
+            tool_name: 工具名称
+
+        Returns:
+            工具存在且为只读工具时返回 True
+        """
+        tool = self.tools.get(tool_name)
+        return tool is not None and tool.cacheable
+
+    @staticmethod
+    def _cache_key(tool_name: str, parameters: Any) -> bytes:
+        """
+        计算工具结果缓存的键
+
+        Args:
+            tool_name: 工具名称
+            parameters: 已解析的参数
+
+        Returns:
+            工具名与规范化参数的 blake2b 摘要
+        """
+        canonical_args = json.dumps(
+            parameters, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+        )
+        return hashlib.blake2b(
+            tool_name.encode("utf-8") + b"\0" + canonical_args.encode("utf-8"),
+            digest_size=16,
+        ).digest()
+
+    def execute(self, tool_name: str, parameters: Union[str, Dict[str, Any]] = "") -> dict:
         """
         安全地执行工具
 
         Args:
             tool_name: 工具名称
-            parameters: 参数
+            parameters: 参数，可以是 JSON 字符串或已解析的参数字典
 
         Returns:
             标准化结果字典，包含 success、result 和 error 字段
         """
 
-        if parameters:
+        if isinstance(parameters, str) and parameters:
             try:
-                parameters = json.loads(parameters)
+                # orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，两种实现的解析错误处理一致
+                parameters = orjson.loads(parameters) if orjson is not None else json.loads(parameters)
             except json.JSONDecodeError:
                 parameters = {}
             except Exception as e:
-                logger.error(f"解析参数失败: {e}")
+                logger.error("解析参数失败: %s", e)
                 return {
                     "success": False,
                     "result": None,
@@ -55,9 +109,9 @@ class ToolExecutor:
             # 检查是否应该停止
             if self.should_stop_check:
                 should_stop_result = self.should_stop_check()
-                logger.debug(f"工具 {tool_name} 执行前检查中断标志: {should_stop_result}")
+                logger.debug("工具 %s 执行前检查中断标志: %s", tool_name, should_stop_result)
                 if should_stop_result:
-                    logger.info(f"工具 {tool_name} 执行被用户中断")
+                    logger.info("工具 %s 执行被用户中断", tool_name)
                     return {
                         "success": False,
                         "result": None,
@@ -74,36 +128,60 @@ class ToolExecutor:
                     "error": f"工具 {tool_name} 不存在。可用工具: {available_tools}"
                 }
 
+            # 只读工具先查缓存，相同参数直接复用上次的结果
+            cache_key = None
+            if tool.cacheable:
+                cache_key = self._cache_key(tool_name, parameters)
+                with self._cache_lock:
+                    cached = self._result_cache.get(cache_key)
+                    if cached is not None:
+                        self._result_cache.move_to_end(cache_key)
+                if cached is not None:
+                    logger.info("工具 %s 命中结果缓存", tool_name)
+                    return dict(cached)
+
             # 执行工具
-            logger.debug(f"执行工具 {tool_name}，参数: {parameters}")
-            result = tool.run(parameters)
+            logger.debug("执行工具 %s，参数: %s", tool_name, parameters)
+            try:
+                result = tool.run(parameters)
+            finally:
+                # 可能修改文件或环境的工具执行后，之前缓存的读取结果都可能过期
+                if not tool.cacheable:
+                    self.clear_cache()
             
             # 执行后再次检查是否应该停止
             if self.should_stop_check:
                 should_stop_result = self.should_stop_check()
-                logger.debug(f"工具 {tool_name} 执行后检查中断标志: {should_stop_result}")
+                logger.debug("工具 %s 执行后检查中断标志: %s", tool_name, should_stop_result)
                 if should_stop_result:
-                    logger.info(f"工具 {tool_name} 执行后被用户中断")
+                    logger.info("工具 %s 执行后被用户中断", tool_name)
                     return {
                         "success": False,
                         "result": None,
                         "error": "工具执行被用户中断"
                     }
-            return {
+            tool_result = {
                 "success": True,
                 "result": result,
                 "error": None
             }
+            if cache_key is not None:
+                with self._cache_lock:
+                    self._result_cache[cache_key] = tool_result
+                    if len(self._result_cache) > _RESULT_CACHE_SIZE:
+                        self._result_cache.popitem(last=False)
+                tool_result = dict(tool_result)
+            return tool_result
 
         except ValueError as e:
-            logger.error(f"解析 action 失败: {e}")
+            logger.error("解析 action 失败: %s", e)
             return {
                 "success": False,
                 "result": None,
                 "error": f"执行工具失败: {e}"
             }
         except Exception as e:
-            logger.exception(f"执行工具时发生异常: {e}")
+            logger.exception("执行工具时发生异常: %s", e)
             return {
                 "success": False,
                 "result": None,
@@ -12,6 +12,9 @@ from utils import validate_path
 class Tool(ABC):
     """工具基类"""
     
+    # 只读且结果只依赖参数的工具可设为 True，相同参数的重复调用会复用缓存结果
+    cacheable: bool = False
+    
     def __init__(self, work_dir: Path):
         """
         初始化工具
@@ -52,7 +55,7 @@ class Tool(ABC):
             if result:
                 import logging
                 logger = logging.getLogger(__name__)
-                logger.info(f"工具 {self.name} 检测到中断标志")
+                logger.info("工具 %s 检测到中断标志", self.name)
             return result
         return False
     
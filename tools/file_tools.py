@@ -16,6 +16,8 @@ from utils import load_gitignore, should_ignore, normalize_path
 class PrintTreeTool(Tool):
     """递归打印指定目录的文件树结构"""
     
+    cacheable = True
+    
     def _get_description(self) -> str:
         return "递归打印指定目录（或仓库根目录）的文件树结构，帮助快速了解项目结构。"
     
@@ -119,6 +121,8 @@ class PrintTreeTool(Tool):
 class ListFilesTool(Tool):
     """列出指定目录下的文件（支持递归）"""
     
+    cacheable = True
+    
     def _get_description(self) -> str:
         return "列出指定目录下的文件（支持递归）。"
     
@@ -193,6 +197,8 @@ class ListFilesTool(Tool):
 class FileSearchTool(Tool):
     """在代码库或文档中全文搜索关键字或正则表达式"""
     
+    cacheable = True
+    
     def _get_description(self) -> str:
         return "在代码库或文档中全文搜索关键字或正则表达式，返回匹配的文件路径和摘要。"
     
@@ -310,6 +316,8 @@ class FileSearchTool(Tool):
 class OpenFileTool(Tool):
     """打开并读取指定文件的内容（最多 20 KB）"""
     
+    cacheable = True
+    
     def _get_description(self) -> str:
         return "打开并读取指定文件的内容（最多 20 KB），返回纯文本。"
     
@@ -378,6 +386,8 @@ class OpenFileTool(Tool):
 class ReadFileTool(Tool):
     """读取文件的完整内容，支持二进制读取和带行号显示"""
     
+    cacheable = True
+    
     def _get_description(self) -> str:
         return "读取文件的完整内容，常用于后续处理。与 open_file 类似，但专注于读取操作，支持二进制读取。可以通过 with_line_numbers 参数选择是否显示行号，这对于后续使用 edit_file_lines 进行基于行号的编辑非常有用。"
     
@@ -505,6 +515,8 @@ class WriteFileTool(Tool):
 class DiffTool(Tool):
     """对比两个文件或目录，返回统一 diff 格式"""
     
+    cacheable = True
+    
     def _get_description(self) -> str:
         return "对比两个文件或目录，返回统一 diff 格式。"
     
@@ -572,6 +584,8 @@ class DiffTool(Tool):
 class ChecksumTool(Tool):
     """计算文件的哈希值（MD5、SHA1、SHA256 等）"""
     
+    cacheable = True
+    
     def _get_description(self) -> str:
         return "计算文件的哈希值（MD5、SHA1、SHA256 等）。"
     
@@ -882,6 +896,8 @@ class EditFilePositionTool(Tool):
 class ReadCodeBlockTool(Tool):
     """读取文件指定行周围的代码块"""
     
+    cacheable = True
+    
     def _get_description(self) -> str:
         return "读取文件指定行周围的代码块（包含前后上下文）。这对于查看搜索结果中特定行的代码上下文非常有用，可以避免读取整个文件，节省上下文空间。"
     
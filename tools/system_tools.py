@@ -125,7 +125,7 @@ class ShellTool(Tool):
                     if self.should_stop():
                         import logging
                         logger = logging.getLogger(__name__)
-                        logger.info(f"检测到中断，正在终止命令进程: {cmd}")
+                        logger.info("检测到中断，正在终止命令进程: %s", cmd)
                         try:
                             process.terminate()
                             process.wait(timeout=5)
@@ -203,7 +203,7 @@ class ShellTool(Tool):
                     if self.should_stop():
                         import logging
                         logger = logging.getLogger(__name__)
-                        logger.info(f"检测到中断，正在终止命令进程: {cmd}")
+                        logger.info("检测到中断，正在终止命令进程: %s", cmd)
                         try:
                             process.terminate()
                             stdout, stderr = process.communicate(timeout=5)
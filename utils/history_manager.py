@@ -106,7 +106,7 @@ class HistoryManager:
             # 按更新时间倒序排列（最新的在前）
             self._histories.sort(key=lambda h: h.updated_at, reverse=True)
         except Exception as e:
-            logger.error(f"加载历史记录失败: {e}")
+            logger.error("加载历史记录失败: %s", e)
             self._histories = []
     
     def _save_histories(self) -> None:
@@ -118,7 +118,7 @@ class HistoryManager:
             with open(self.history_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
         except Exception as e:
-            logger.error(f"保存历史记录失败: {e}")
+            logger.error("保存历史记录失败: %s", e)
     
     def save_chat(
         self,